@@ -15,3 +15,11 @@ class AlgorithmEngine:
     def close(self):
         """关闭引擎"""
         pass
+
+    def new_game(self):
+        """开始新对局，清空引擎中的棋盘；无状态的引擎无需处理"""
+        pass
+
+    def has_final_result(self, board: ChessBoard) -> bool:
+        """该局面是否已有不会再变化的最终分析结果；无法判断时返回False，调用方会照常重新查询"""
+        return False
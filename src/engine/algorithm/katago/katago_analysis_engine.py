@@ -1,40 +1,134 @@
-import json
+import io
 import logging
+import os
+import queue
 import subprocess
-import time
+import sys
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from logging.handlers import QueueListener
 from threading import Thread
+from types import MappingProxyType
 from typing import Any, Dict
 from warnings import deprecated
 
+import numpy as np
+
 from src.engine.algorithm.algorithm import AlgorithmEngine
 from src.engine.board import ChessBoard, BLACK, WHITE, MoveItem
-from src.engine.util import gtp_2_np
+from src.engine.util import gtp_2_np, gtp_coord_table, AnalyzedLRUCache
+
+try:
+    import orjson
+
+    def dumps_line(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+
+    loads = orjson.loads
+except ImportError:
+    import json
+
+    def dumps_line(obj) -> bytes:
+        return (json.dumps(obj) + "\n").encode()
+
+    loads = json.loads
+
+# Linux下管道默认64KB，KataGo初始化时大量输出日志，放大到1MB减少读写唤醒次数
+PIPE_SIZE = 1 << 20
+# 带policy的分析响应单行可达上百KB，用户态读缓冲放大到64KB，减少readline的read次数
+STDOUT_BUFFER_SIZE = 1 << 16
+
+# 棋子值 -> GTP颜色，按棋子值直接索引
+COLOR_TABLE = np.empty(max(BLACK, WHITE) + 1, dtype=object)
+COLOR_TABLE[BLACK] = "B"
+COLOR_TABLE[WHITE] = "W"
+
+
+@lru_cache(maxsize=8)
+def query_template(board_size: int) -> MappingProxyType:
+    """
+    每次查询中不变的字段，按棋盘尺寸只构造一次，只读
+    """
+    return MappingProxyType({
+        "moves": [],
+        "rules": "Chinese",
+        "komi": 0,
+        "boardXSize": board_size,
+        "boardYSize": board_size,
+        "includePolicy": True,
+    })
+
+
+def widen_pipe(pipe, size=PIPE_SIZE):
+    """
+    尝试通过 F_SETPIPE_SZ 放大管道缓冲区，仅Linux有效，其他平台或失败时忽略
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        import fcntl
+        fcntl.fcntl(pipe.fileno(), getattr(fcntl, "F_SETPIPE_SZ", 1031), size)
+    except OSError as e:
+        logging.info(f"Failed to widen pipe buffer: {e}")
 
 
 @deprecated("KataGoAnalysisEngine is obsolete, please use KataGoGTPEngine instead")
 class KataGoAnalysisEngine(AlgorithmEngine):
 
-    def __init__(self, katago_path: str, config_path: str, model_path: str, additional_args=None, board_size=15):
+    def __init__(self, katago_path: str, config_path: str, model_path: str, additional_args=None, board_size=15,
+                 cache_size=1024, debug=False):
         if additional_args is None:
             additional_args = []
         self.query_counter = 0
+        # 分析模式下同一局面、同一执子方、同一访问数的结果是确定的，按 (hash, player, max_visits) 缓存
+        self.cache = AnalyzedLRUCache(maxsize=cache_size)
         katago_ = subprocess.Popen(
             [katago_path, "analysis", "-config", config_path, "-model", model_path, *additional_args],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            # 非调试模式下KataGo日志直接丢弃，既不需要管道也不需要读取线程
+            stderr=subprocess.PIPE if debug else subprocess.DEVNULL,
+            bufsize=STDOUT_BUFFER_SIZE,
         )
         self.katago = katago_
+        # 查询直接写入stdin的文件描述符，绕过BufferedWriter的拷贝与flush
+        self._stdin_fd = katago_.stdin.fileno()
+        widen_pipe(katago_.stdout)
+        self.stderrthread = None
+        if debug:
+            widen_pipe(katago_.stderr)
+            self._start_stderr_logging()
+
+        # 分析协议允许多个查询同时在途，响应按id分发给对应的Future
+        self._pending: Dict[str, Future] = {}
+        self._pending_lock = threading.Lock()
+        # 写stdin可能因管道写满而阻塞，单独加锁，不能占用读取线程分发响应所需的 _pending_lock
+        self._write_lock = threading.Lock()
+        self.stdoutthread = Thread(target=self.read_forever)
+        self.stdoutthread.start()
+
+    def _start_stderr_logging(self):
+        # stderr线程只负责把日志记录放入队列，格式化与输出由QueueListener在后台线程完成
+        log_queue = queue.SimpleQueue()
+        log_handlers = logging.getLogger().handlers or [logging.StreamHandler()]
+        self.log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+        self.log_listener.start()
+
+        def log_stderr(data):
+            log_queue.put_nowait(logging.makeLogRecord({
+                "name": "KataGo", "levelno": logging.INFO, "levelname": "INFO",
+                "msg": "KataGo: %s", "args": (data.rstrip("\n"),)
+            }))
+
+        # stderr按块缓冲解码，避免逐行decode；stdin/stdout保持二进制以便直接收发JSON字节
+        stderr = io.TextIOWrapper(self.katago.stderr, encoding="utf-8", errors="replace")
 
         def print_forever():
-            while katago_.poll() is None:
-                data = katago_.stderr.readline()
-                time.sleep(0)
-                if data:
-                    logging.info("KataGo: " + data.decode())
-            data = katago_.stderr.read()
-            if data:
-                logging.info("KataGo: " + data.decode())
+            # readline阻塞直到有数据，KataGo退出关闭管道后读到EOF自然结束，无需轮询进程状态
+            for data in iter(stderr.readline, ""):
+                log_stderr(data)
+            self.log_listener.stop()
 
         self.stderrthread = Thread(target=print_forever)
         self.stderrthread.start()
@@ -43,37 +137,24 @@ class KataGoAnalysisEngine(AlgorithmEngine):
         self.katago.stdin.close()
 
     def query(self, initial_board: ChessBoard, max_visits=None, initial_player="b"):
-
-        query = {"id": str(self.query_counter)}
-        self.query_counter += 1
+        key = (initial_board.get_hash(), initial_player, max_visits)
+        val = self.cache.get(key)
+        if val is not None:
+            return val
 
         board_size = initial_board.get_size()
+        query = {"id": str(self.query_counter), **query_template(board_size)}
+        self.query_counter += 1
 
-        query["initialStones"] = []
-        for y in range(board_size):
-            for x in range(board_size):
-                color_code = initial_board.get_piece(y, x)
-                if color_code == BLACK:
-                    color_str = "B"
-                elif color_code == WHITE:
-                    color_str = "W"
-                else:
-                    continue
-
-                letter = chr(ord('A') + x)
-                if letter >= 'I':
-                    letter = chr(ord(letter) + 1)
-                number = board_size - y
-                coord = f"{letter}{number}"
-
-                query["initialStones"].append([color_str, coord])
-
-        query["moves"] = []
-        query["rules"] = "Chinese"
-        query["komi"] = 0
-        query["boardXSize"] = board_size
-        query["boardYSize"] = board_size
-        query["includePolicy"] = True
+        if initial_board.is_empty():
+            # 开局空棋盘无需扫描
+            query["initialStones"] = []
+        else:
+            board = initial_board.as_ndarray()
+            ys, xs = np.nonzero(board)
+            colors = COLOR_TABLE[board[ys, xs]].tolist()
+            coords = gtp_coord_table(board_size)[ys, xs].tolist()
+            query["initialStones"] = [[color, gtp] for color, gtp in zip(colors, coords)]
         query["initialPlayer"] = initial_player
         if max_visits is not None:
             query["maxVisits"] = max_visits
@@ -91,18 +172,56 @@ class KataGoAnalysisEngine(AlgorithmEngine):
             row, col = gtp_2_np(best_move, board_size)
             best_move_list.append(MoveItem(move=(row, col), gtp=best_move, visits=moveInfo.get('visits'),
                                            weight=moveInfo.get('weight'), winrate=moveInfo.get('winrate')))
-        return current_player, best_move_list, analysis_result[:7]
+        result = current_player, best_move_list, analysis_result
+        self.cache[key] = result
+        return result
 
     def query_raw(self, query: Dict[str, Any]):
-        self.katago.stdin.write((json.dumps(query) + "\n").encode())
-        self.katago.stdin.flush()
-        line = ""
-        while line == "":
-            if self.katago.poll():
-                time.sleep(1)
+        return self.submit(query).result()
+
+    def submit(self, query: Dict[str, Any]) -> Future:
+        """
+        发送查询但不等待结果，返回的Future在收到同id的响应后完成，可一次提交多个查询流水线执行
+        """
+        future = Future()
+        with self._pending_lock:
+            if self.katago.poll() is not None:
                 raise Exception("Unexpected katago exit")
-            line = self.katago.stdout.readline()
-            line = line.decode().strip()
-        logging.info(f"query_raw json line:\n {line}")
-        response = json.loads(line)
-        return response
+            self._pending[query["id"]] = future
+        try:
+            with self._write_lock:
+                self._write_stdin(dumps_line(query))
+        except OSError as e:
+            with self._pending_lock:
+                self._pending.pop(query["id"], None)
+            future.set_exception(e)
+        return future
+
+    def _write_stdin(self, payload: bytes):
+        # 超过PIPE_BUF的写入可能只写入一部分，循环直到全部写完
+        view = memoryview(payload)
+        while view:
+            written = os.write(self._stdin_fd, view)
+            view = view[written:]
+
+    def read_forever(self):
+        for line in iter(self.katago.stdout.readline, b""):
+            line = line.strip()
+            if not line:
+                continue
+            # 响应行可能超过100KB，只有在需要输出时才解码
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info("query_raw json line:\n %s", line.decode())
+            response = loads(line)
+            if "warning" in response:
+                # 警告不是最终结果，同id的分析结果随后到达
+                continue
+            with self._pending_lock:
+                future = self._pending.pop(response.get("id"), None)
+            if future is not None:
+                future.set_result(response)
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            future.set_exception(Exception("Unexpected katago exit"))
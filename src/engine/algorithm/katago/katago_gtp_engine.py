@@ -1,22 +1,35 @@
+import io
 import logging
+import queue
 import subprocess
 import threading
-import time
 from threading import Thread
 from typing import Dict, Any
 
 from src.engine.algorithm.algorithm import AlgorithmEngine
 from src.engine.board import ChessBoard, BLACK, MoveItem
-from src.engine.util import np_to_gtp, chess2color, parse_gtp_info, gtp_2_np, AnalyzedLRUCache
+from src.engine.util import np_to_gtp, chess2color, parse_gtp_info, gtp_2_np, AnalyzedLRUCache, \
+    set_process_affinity
 
 
 # ./engine/gom15x_trt.exe gtp -config ./engine.cfg -model ./weights/zhizi_renju28b_s1600.bin.gz -override-config
 # basicRule=RENJU
+
+# KataGo 完成模型加载、开始处理GTP命令时在stderr输出的提示
+READY_MARKERS = ("GTP ready", "ready to begin handling commands")
+READY_TIMEOUT = 60
+# stdout原始行队列容量，满时丢弃最旧的行（只有最新的info行有意义）
+RAW_QUEUE_SIZE = 1024
+# 每次分析结果只展示前几个候选点
+SHOW_MOVES = 7
+
+
 class KataGoGTPEngine(AlgorithmEngine):
 
     def __init__(self, katago_path: str, config_path: str, model_path: str, additional_args=None, board_size=15, config: Dict[str, Any] = None):
         self.save_thread = None
         self.stdout_thread = None
+        self.parser_thread = None
         self.stderr_thread = None
         self.board_size = board_size
         self.visits_threshold = config.get("visits_threshold", 2000)
@@ -31,75 +44,71 @@ class KataGoGTPEngine(AlgorithmEngine):
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            universal_newlines=True,
-            bufsize=1
         )
+        # 在KataGo创建搜索线程之前绑定核心，其后创建的线程都继承该掩码
+        set_process_affinity(katago.pid, config.get("katago_cpus"))
         self.cache_board = ChessBoard(size=self.board_size)
         self.katago = katago
-        self.best_moves_shared = "pass", []
-        self.res_lock = threading.Lock()
-        self.running = True
-        self.state_lock = threading.Lock()
+        # 最新分析结果由stdout线程整体替换（元组赋值在CPython中是原子的），无需加锁
+        self._latest = "pass", []
+        self._new_result = threading.Event()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._last_line = None
+        self._raw_q = queue.Queue(maxsize=RAW_QUEUE_SIZE)
+        self._pending = []
+        self._stdin_lock = threading.Lock()
+        # 已发送的GTP命令数，作为命令序号；当前 kata-analyze 的 (命令序号, 局面hash, 执子方)
+        self._sent = 0
+        self._analysis = (0, None, None)
         self.query_total = 0
         self.refresh_total = 0
         logging.info("KataGo GTP Engine is currently undergoing initialization...")
-        time.sleep(20)
         self.async_handler()
-        time.sleep(2)
-        logging.info("KataGo GTP Engine Initialization successful!")
+        if self._ready.wait(timeout=READY_TIMEOUT):
+            logging.info("KataGo GTP Engine Initialization successful!")
+        else:
+            logging.warning(f"KataGo GTP Engine did not report ready within {READY_TIMEOUT}s, continue anyway")
         self.run_scheduled_task()
 
-    def read_state(self):
-        state = True
-        with self.state_lock:
-            state = self.running
-        return state
-
-    def set_state(self, state):
-        with self.state_lock:
-            self.running = state
-        return state
-
     def close(self):
-        self.set_state(False)
+        # 关闭stdin后KataGo退出，stdout/stderr读到EOF，读取线程随之结束
+        self._stop.set()
         self.katago.stdin.close()
+        self.cache.save_to_file(self.chess_manual_path)
 
     def query(self, initial_board: ChessBoard, initial_player='b'):
-        logging.info(self.get_engine_info())
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(self.get_engine_info())
         # 获取棋盘尺寸
         board_size = initial_board.get_size()
         self.query_total += 1
-        diff_list = []
-        if initial_board.has_extra_pieces(self.cache_board):
+        # 命中历史局面时无需同步棋盘和分析，cache_board 落后的部分在下一次未命中时一并补齐
+        val = self.cache.get(initial_board.get_hash())
+        if val is not None:
+            current_play, best_move_list = val
+            return current_play, best_move_list, {}
+
+        needs_refresh, diff_list = initial_board.diff_with_refresh(self.cache_board)
+        if needs_refresh:
             logging.info("=====The chessboard status is inconsistent and needs to be refreshed=====")
             self.cache_board.reset()
             logging.info(f"self.cache_board:\n{self.cache_board.render_numpy_board()}")
             logging.info(f"initial_board   :\n{initial_board.render_numpy_board()}")
             logging.info("=====The chessboard status is inconsistent and needs to be refreshed=====")
-            diff_list = initial_board.diff(self.cache_board)
             self.reset()
             self.refresh_total += 1
-        else:
-            diff_list = initial_board.diff(self.cache_board)
 
         for diff_item in diff_list:
             chess, position = diff_item
             row_idx, col_idx = position
             self.cache_board.place_piece(row_idx, col_idx, chess)
-            self.play(chess, row_idx, col_idx, board_size)
+            self.play(chess, row_idx, col_idx, board_size, flush=False)
+        self._flush_pending()
 
         if not self.cache_board.equals(initial_board):
             raise "System ERROR!!!"
 
-        board_hash = self.cache_board.get_hash()
-        val = self.cache.get(board_hash)
-        if val is not None:
-            current_play, best_move_list = val
-            return current_play, best_move_list, {}
-
         current_play, best_move_list = self.kata_analyze(self.cache_board.determine_current_player(), 10)
 
         return current_play, best_move_list, {}
@@ -107,74 +116,142 @@ class KataGoGTPEngine(AlgorithmEngine):
     def reset(self):
         self.exec_async("clear_board")
 
+    def new_game(self):
+        """
+        对局结束时清空引擎中的棋盘与搜索树，KataGo进程与已加载的模型保持不变，历史局面缓存保留
+        """
+        self.stop_kata_analyze()
+        self.cache_board.reset()
+        self.reset()
+
+    def has_final_result(self, board: ChessBoard) -> bool:
+        """
+        访问数达到阈值的局面会写入历史局面缓存，之后的查询直接返回该结果
+        """
+        return board.get_hash() in self.cache
+
     def stop_kata_analyze(self):
         self.exec_async("stop")
 
-    def play(self, chess, row, col, board_size):
+    def play(self, chess, row, col, board_size, flush=True):
         gtp = np_to_gtp(row, col, board_size)
         chess_color = chess2color(chess)
-        self.exec_async(f"play {chess_color} {gtp}")
+        self.exec_async(f"play {chess_color} {gtp}", flush=flush)
 
     def kata_analyze(self, next_step_chess, cal_time):
         chess_color = chess2color(next_step_chess)
-        self.exec_async(f"kata-analyze {chess_color} {cal_time} pvVisits true")
-        with self.res_lock:
-            current = self.best_moves_shared
-        return current
+        self._new_result.clear()
+        seq = self.exec_async(f"kata-analyze {chess_color} {cal_time} pvVisits true", flush=False)
+        # 在命令写出之前记下本次分析对应的局面，解析线程据此归属info行，而不是读取解析时的 cache_board
+        self._analysis = (seq, self.cache_board.get_hash(), chess_color)
+        self._flush_pending()
+        # 最多等待一个汇报周期(cal_time单位为厘秒)，拿到本次分析的首个结果
+        self._new_result.wait(timeout=cal_time / 100)
+        return self._latest
 
-    def exec_async(self, query: str):
+    def exec_async(self, query: str, flush=True) -> int:
+        """
+        发送GTP命令，flush=False 时命令先暂存，由下一次 flush 合并为一次写入
+        返回命令序号：KataGo按发送顺序应答，读到第N个应答即表示第N条命令已开始执行
+        """
         logging.info(f"[EXEC Command] input: {query}")
-        self.katago.stdin.write(query + "\n")
-        self.katago.stdin.flush()
+        with self._stdin_lock:
+            self._pending.append(query)
+            self._sent += 1
+            seq = self._sent
+        if flush:
+            self._flush_pending()
+        return seq
+
+    def _flush_pending(self):
+        with self._stdin_lock:
+            if not self._pending:
+                return
+            self.katago.stdin.write(("\n".join(self._pending) + "\n").encode())
+            self.katago.stdin.flush()
+            self._pending.clear()
 
     def handler_stdout(self):
-        while self.read_state():
-            line = ""
-            while self.read_state() and line == "":
-                if self.katago.poll():
-                    time.sleep(1)
-                    raise Exception("Unexpected katago exit")
-                line = self.katago.stdout.readline()
-                line = line.strip()
-            if len(line.strip()) == 0 or line.strip() == "=":
+        """
+        只负责尽快读空stdout，避免Python侧解析反压KataGo的输出
+        """
+        raw_q = self._raw_q
+        # 在读取线程中统计应答数（'='/'?'开头的行），队列满时丢弃旧行也不会漏数
+        acked = 0
+        for line in iter(self.katago.stdout.readline, b''):
+            if self._stop.is_set():
+                break
+            if line[:1] in (b"=", b"?"):
+                acked += 1
+            item = (acked, line)
+            try:
+                raw_q.put_nowait(item)
+            except queue.Full:
+                try:
+                    raw_q.get_nowait()
+                except queue.Empty:
+                    pass
+                raw_q.put_nowait(item)
+        if not self._stop.is_set():
+            logging.error("Unexpected katago exit")
+        raw_q.put(None)
+        logging.info("handle stdout thread stop...")
+
+    def handler_parse(self):
+        """
+        从队列中取出stdout行，解析info并发布最新结果、写入缓存
+        """
+        for acked, line in iter(self._raw_q.get, None):
+            # stdout为二进制管道，info行是纯ASCII，先按字节过滤，只解码需要解析的行
+            line = line.rstrip()
+            if len(line) <= 1:
+                continue
+            if not line.startswith(b"info"):
+                logging.error(f"Unexpected katago error: {line.decode(errors='replace')}")
                 continue
-            if not line.startswith("info"):
-                logging.error(f"Unexpected katago error: {line}")
+            analysis_seq, board_hash, current_play = self._analysis
+            # 只有最近一次 kata-analyze 已被应答、且其后没有其他命令被应答时，info行才属于当前局面；
+            # 否则是上一次分析残留在管道或队列中的输出，不能发布，更不能以当前局面的hash写入棋谱
+            if acked != analysis_seq:
                 continue
-            res_list = parse_gtp_info(line)
+            # KataGo在搜索结果未变化时会重复输出相同的info行，无需重复解析与发布
+            if line == self._last_line:
+                continue
+            self._last_line = line
+            res_list = parse_gtp_info(line.decode(), SHOW_MOVES)
             best_move_list = []
-            current_play = chess2color(self.cache_board.determine_current_player())
-            for item in res_list[:7]:
+            for item in res_list:
                 best_move = item.get('move')
                 if best_move[0] == 'p':
                     continue
-                row, col = gtp_2_np(best_move, self.cache_board.get_size())
+                row, col = gtp_2_np(best_move, self.board_size)
                 best_move_list.append(MoveItem(move=(row, col), gtp=best_move, visits=int(item.get('visits')),
                                                weight=item.get('weight'), winrate=float(item.get('winrate'))))
             if len(best_move_list) != 0 and int(best_move_list[0].visits) > self.visits_threshold:
                 self.stop_kata_analyze()
-                board_hash = self.cache_board.get_hash()
                 self.cache[board_hash] = (current_play, best_move_list)
 
-            with self.res_lock:
-                self.best_moves_shared = (current_play, best_move_list)
-        logging.info("handle stdout thread stop...")
+            self._latest = (current_play, best_move_list)
+            self._new_result.set()
+        logging.info("handle parse thread stop...")
 
     def handler_stderr(self):
-        while self.read_state():
-            line = ""
-            while self.read_state() and line == "":
-                if self.katago.poll():
-                    time.sleep(1)
-                    raise Exception("Unexpected katago exit")
-                line = self.katago.stderr.readline()
-                line = line.strip()
-            logging.warn(f"[GTP Command ERROR] Wrong output: {line}")
+        stderr = io.TextIOWrapper(self.katago.stderr, encoding="utf-8", errors="replace")
+        for line in iter(stderr.readline, ''):
+            if self._stop.is_set():
+                break
+            if not self._ready.is_set() and any(marker in line for marker in READY_MARKERS):
+                self._ready.set()
+            logging.warning(f"[GTP Command ERROR] Wrong output: {line.strip()}")
+        # 进程提前退出时不再等待就绪
+        self._ready.set()
         logging.info("handle stderr thread stop...")
 
     def async_handler(self):
         self.stdout_thread = Thread(target=self.handler_stdout)
         self.stdout_thread.start()
+        self.parser_thread = Thread(target=self.handler_parse)
+        self.parser_thread.start()
         self.stderr_thread = Thread(target=self.handler_stderr)
         self.stderr_thread.start()
 
@@ -191,8 +268,7 @@ class KataGoGTPEngine(AlgorithmEngine):
                 f"=============query refresh rate  : {refresh_rate:.2f}%=============")
 
     def save_task(self):
-        while self.read_state():
-            time.sleep(5)
+        while not self._stop.wait(5):
             self.cache.save_to_file(self.chess_manual_path)
 
     def run_scheduled_task(self):
@@ -87,7 +87,13 @@ class KatagoEngine:
             'RENJU': "basicRule=RENJU",
             'STANDARD': "basicRule=STANDARD"
         }
-        additional_args = ["-override-config", rule_configs.get(rule, "basicRule=RENJU")]
+        overrides = [rule_configs.get(rule, "basicRule=RENJU")]
+        # 搜索线程数与神经网络批大小按硬件调整，未配置时沿用cfg文件中的值
+        if config.get('search_threads'):
+            overrides.append(f"numSearchThreads={int(config['search_threads'])}")
+        if config.get('nn_max_batch_size'):
+            overrides.append(f"nnMaxBatchSize={int(config['nn_max_batch_size'])}")
+        additional_args = ["-override-config", ",".join(overrides)]
 
         try:
             katago = KataGoGTPEngine(
@@ -107,7 +113,8 @@ class KatagoEngine:
 
     def analyze(self, board: ChessBoard) -> Tuple[str, List[MoveItem], Dict[str, Any]]:
         try:
-            logging.info(f"\nThis request is for the status of the chessboard:\n{board.render_numpy_board()}")
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info("\nThis request is for the status of the chessboard:\n%s", board.render_numpy_board())
 
             initial_player = "PASS"
             play = board.determine_current_player()
@@ -122,6 +129,19 @@ class KatagoEngine:
             logging.error(f"Analysis failed: {e}")
             return "PASS", [], {}
 
+    def reset(self):
+        """
+        开始新对局：复用已启动的KataGo进程，只清空其棋盘
+        """
+        if self.instance is not None:
+            self.instance.new_game()
+
+    def has_final_result(self, board: ChessBoard) -> bool:
+        """
+        该局面是否已分析到访问数阈值并写入缓存；此时再次 analyze 只会返回同样的缓存结果
+        """
+        return self.instance is not None and self.instance.has_final_result(board)
+
     def get_engine_info(self) -> Dict[str, Any]:
         return {
             'name': 'KataGo',
@@ -1,6 +1,6 @@
-import hashlib
 import logging
 from dataclasses import dataclass
+from functools import lru_cache
 
 import numpy as np
 from typing import Optional, Tuple, List
@@ -8,14 +8,86 @@ from typing import Optional, Tuple, List
 BLACK = 1
 WHITE = 2
 
+# 棋子值 -> 渲染字符：空 '.'，黑 'X'，白 'O'
+_RENDER_CHARS = np.array(['.', 'X', 'O'])
+# 棋子值只有0/1/2，用int8存储，棋盘只占225字节
+BOARD_DTYPE = np.int8
+# GTP列坐标字母表（跳过字母I）
+GTP_COLUMNS = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+
+
+# splitmix64 的步长与两个混合乘数
+_SPLITMIX64_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_SPLITMIX64_MUL1 = np.uint64(0xBF58476D1CE4E5B9)
+_SPLITMIX64_MUL2 = np.uint64(0x94D049BB133111EB)
+
+
+@lru_cache(maxsize=None)
+def _zobrist_table(size: int) -> np.ndarray:
+    """
+    Zobrist随机数表，形状 (size, size, 3)，按 [行, 列, 棋子] 取值
+    由种子为0的splitmix64序列生成，只依赖固定的算法而非NumPy随机数生成器的实现，
+    不同进程、不同NumPy版本下hash都一致，持久化的棋谱缓存不会因升级而全部失效
+    """
+    z = np.arange(1, size * size * 3 + 1, dtype=np.uint64) * _SPLITMIX64_GAMMA
+    z = (z ^ (z >> np.uint64(30))) * _SPLITMIX64_MUL1
+    z = (z ^ (z >> np.uint64(27))) * _SPLITMIX64_MUL2
+    z ^= z >> np.uint64(31)
+    return z.reshape(size, size, 3)
+
+
+def _has_five(mask: np.ndarray) -> bool:
+    """
+    判断布尔棋盘中是否存在横、竖、两条斜线方向上连续5个True：
+    将5个错位切片按位与，结果中任一位置为True即表示以该位置为起点存在五连
+    """
+    k = mask.shape[0] - 4
+    if k <= 0:
+        return False
+    horizontal = mask[:, 0:k]
+    vertical = mask[0:k, :]
+    diagonal = mask[0:k, 0:k]
+    anti_diagonal = mask[0:k, 4:4 + k]
+    for i in range(1, 5):
+        horizontal = horizontal & mask[:, i:i + k]
+        vertical = vertical & mask[i:i + k, :]
+        diagonal = diagonal & mask[i:i + k, i:i + k]
+        anti_diagonal = anti_diagonal & mask[i:i + k, 4 - i:4 - i + k]
+    return bool(horizontal.any() or vertical.any() or diagonal.any() or anti_diagonal.any())
+
+
+@lru_cache(maxsize=None)
+def _column_header(size: int) -> str:
+    """渲染棋盘时的列标题行，按棋盘尺寸缓存"""
+    return f"    {' '.join(GTP_COLUMNS[:size])}"
+
 
 class ChessBoard:
     def __init__(self, size: int = 15, board: np.array = None):
         self.size = size
         if board is not None:
-            self.board = board
+            self.board = np.asarray(board, dtype=BOARD_DTYPE)
         else:
-            self.board = np.zeros((size, size), dtype=int)
+            self.board = np.zeros((size, size), dtype=BOARD_DTYPE)
+        # 棋盘版本号，任何落子/提子/整盘替换后递增，供上层按版本缓存派生结果
+        self._version = 0
+        self._render_cache = (None, "")
+        self._refresh_state()
+
+    def _refresh_state(self) -> None:
+        """
+        整盘替换后重新计算hash与黑白棋子数
+        """
+        self._hash = self._compute_hash()
+        counts = np.bincount(self.board.ravel(), minlength=3)
+        self._black_count = int(counts[BLACK])
+        self._white_count = int(counts[WHITE])
+        self._version += 1
+
+    def _compute_hash(self) -> int:
+        rows, cols = np.nonzero(self.board)
+        keys = _zobrist_table(self.size)[rows, cols, self.board[rows, cols]]
+        return int(np.bitwise_xor.reduce(keys))
 
     def equals(self, other: 'ChessBoard') -> bool:
         """
@@ -25,17 +97,41 @@ class ChessBoard:
             return False
         return np.array_equal(self.board, other.board)
 
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ChessBoard):
+            return NotImplemented
+        # Zobrist hash 不同则局面必然不同，无需逐格比较
+        if self._hash != other._hash:
+            return False
+        return self.equals(other)
+
+    def __hash__(self) -> int:
+        """
+        使用增量维护的 Zobrist hash，棋盘可直接作为 dict 的键；作为键期间不要再修改棋盘
+        """
+        return self._hash
+
     def reset(self) -> None:
-        self.board = np.zeros((self.size, self.size), dtype=int)
+        self.board = np.zeros((self.size, self.size), dtype=BOARD_DTYPE)
+        self._hash = 0
+        self._black_count = 0
+        self._white_count = 0
+        self._version += 1
 
     def place_piece(self, row: int, col: int, chess: int) -> bool:
         if not (0 <= row < self.size and 0 <= col < self.size):
             return False
 
+        # Zobrist表只为黑白两种棋子提供有效的键，其他值会破坏hash或越界
+        if chess not in (BLACK, WHITE):
+            return False
+
         if self.board[row, col] != 0:
             return False
 
         self.board[row, col] = chess
+        self._hash ^= int(_zobrist_table(self.size)[row, col, chess])
+        self._update_count(chess, 1)
         return True
 
     def remove_piece(self, row: int, col: int) -> bool:
@@ -45,9 +141,19 @@ class ChessBoard:
         if self.board[row, col] == 0:
             return False
 
+        chess = self.board[row, col]
+        self._hash ^= int(_zobrist_table(self.size)[row, col, chess])
+        self._update_count(chess, -1)
         self.board[row, col] = 0
         return True
 
+    def _update_count(self, chess: int, delta: int) -> None:
+        if chess == BLACK:
+            self._black_count += delta
+        elif chess == WHITE:
+            self._white_count += delta
+        self._version += 1
+
     def get_piece(self, row: int, col: int) -> int:
         if not (0 <= row < self.size and 0 <= col < self.size):
             return -1
@@ -60,31 +166,36 @@ class ChessBoard:
     def get_board(self) -> np.ndarray:
         return self.board.copy()
 
+    def as_ndarray(self) -> np.ndarray:
+        """
+        返回底层棋盘数组（不复制），调用方只读使用，修改请走 place_piece/remove_piece 以保证hash一致
+        """
+        return self.board
+
     def set_board(self, new_board: np.ndarray) -> bool:
         if new_board.shape != (self.size, self.size):
             return False
 
-        self.board = new_board.copy()
+        self.board = new_board.astype(BOARD_DTYPE, copy=True)
+        self._refresh_state()
         return True
 
     def count_pieces(self, chess: Optional[int] = None) -> int:
         if chess is None:
-            return np.count_nonzero(self.board)
+            return self._black_count + self._white_count
+        elif chess == BLACK:
+            return self._black_count
+        elif chess == WHITE:
+            return self._white_count
         else:
-            return np.count_nonzero(self.board == chess)
+            return int(np.count_nonzero(self.board == chess))
 
     def is_effective_chessboard(self) -> bool:
-        count1 = np.count_nonzero(self.board == WHITE)
-        count2 = np.count_nonzero(self.board == BLACK)
-        return abs(count1 - count2) <= 1 and count2 >= count1
+        return 0 <= self._black_count - self._white_count <= 1
 
     def find_pieces(self, player: int) -> List[Tuple[int, int]]:
-        positions = []
-        for i in range(self.size):
-            for j in range(self.size):
-                if self.board[i, j] == player:
-                    positions.append((i, j))
-        return positions
+        rows, cols = np.nonzero(self.board == player)
+        return list(zip(rows.tolist(), cols.tolist()))
 
     def save_to_file(self, filename: str) -> None:
         np.save(filename, self.board)
@@ -93,7 +204,8 @@ class ChessBoard:
         try:
             loaded_board = np.load(filename)
             if loaded_board.shape == (self.size, self.size):
-                self.board = loaded_board
+                self.board = loaded_board.astype(BOARD_DTYPE, copy=False)
+                self._refresh_state()
                 return True
             else:
                 logging.info(
@@ -111,51 +223,40 @@ class ChessBoard:
         if board_state.shape != (self.size, self.size):
             raise ValueError(f"The chessboard must be a {self.size}x{self.size} numpy array")
 
-        black_count = np.sum(board_state == BLACK)
-        white_count = np.sum(board_state == WHITE)
+        black_count = self._black_count
+        white_count = self._white_count
 
-        if white_count > black_count:
-            raise ValueError(
-                f"Invalid chessboard state: There are more white({white_count}) chess than black({black_count}) chess")
-        if black_count - white_count > 1:
+        # 合法局面下黑子数等于白子数或多1，只在非法时才进入分支构造错误信息
+        if not 0 <= black_count - white_count <= 1:
+            if white_count > black_count:
+                raise ValueError(
+                    f"Invalid chessboard state: There are more white({white_count}) chess than black({black_count}) chess")
             raise ValueError(
                 f"Invalid Chessboard State: Black Chess ({black_count}) has more than 1 more than White Chess ({white_count})")
 
-        if black_count == white_count:
-            return BLACK
-        else:
-            return WHITE
+        return WHITE if black_count > white_count else BLACK
 
     def render_numpy_board(self):
-        """生成棋盘字符串：列标题 + 倒序行号（15到1） + 保持数组原始顺序的内容"""
+        """生成棋盘字符串：列标题 + 倒序行号（15到1） + 保持数组原始顺序的内容，按棋盘版本缓存"""
+        version, rendered = self._render_cache
+        if version == self._version:
+            return rendered
         board_str = []
 
-        col_titles = []
-        for i in range(15):
-            if i < 8:
-                col_titles.append(chr(ord('A') + i))
-            else:
-                col_titles.append(chr(ord('A') + i + 1))
-
-        board_str.append(f"    {' '.join(col_titles)}")
+        board_str.append(_column_header(self.size))
 
         for display_row_num in range(self.size, 0, -1):
 
             array_index = self.size - display_row_num
             formatted_row_num = f"{display_row_num:2d}"
 
-            row_chars = []
-            for val in self.board[array_index]:
-                if val == 1:
-                    row_chars.append('X')
-                elif val == 2:
-                    row_chars.append('O')
-                else:
-                    row_chars.append('.')
+            row_chars = _RENDER_CHARS[self.board[array_index]].tolist()
 
             board_str.append(f"{formatted_row_num}  {' '.join(row_chars)}")
 
-        return '\n'.join(board_str)
+        rendered = '\n'.join(board_str)
+        self._render_cache = (self._version, rendered)
+        return rendered
 
     def get_size(self) -> int:
         return self.board.shape[0]
@@ -169,14 +270,26 @@ class ChessBoard:
         if self.size != other.size:
             raise ValueError("Two chessboards of different sizes")
 
-        differences = []
-        for i in range(self.size):
-            for j in range(self.size):
-                if self.board[i, j] != 0 and other.board[i, j] == 0:
-                    differences.append((self.board[i, j], (i, j)))
-                elif self.board[i, j] == 0 and other.board[i, j] != 0:
-                    differences.append((other.board[i, j], (i, j)))
-        return differences
+        # 恰好一侧有棋子的位置，另一侧为0，两盘相加即为该位置的棋子
+        rows, cols = np.nonzero((self.board != 0) != (other.board != 0))
+        chess = self.board[rows, cols] + other.board[rows, cols]
+        return list(zip(chess.tolist(), zip(rows.tolist(), cols.tolist())))
+
+    def diff_with_refresh(self, other: 'ChessBoard') -> Tuple[bool, list]:
+        """
+        一次比较得到将另一个棋盘同步为当前棋盘所需的落子。
+        若另一个棋盘上存在当前棋盘没有的棋子，则需要清空后重新落下当前棋盘的全部棋子，返回(True, 全部棋子)；
+        否则返回(False, 当前棋盘有而另一个棋盘没有的棋子)。列表元素格式与diff相同。
+        """
+        if self.size != other.size:
+            raise ValueError("Two chessboards of different sizes")
+
+        occupied = self.board != 0
+        needs_refresh = bool(np.any((other.board != 0) & ~occupied))
+        mask = occupied if needs_refresh else occupied & (other.board == 0)
+        rows, cols = np.nonzero(mask)
+        chess = self.board[rows, cols]
+        return needs_refresh, list(zip(chess.tolist(), zip(rows.tolist(), cols.tolist())))
 
     def has_extra_pieces(self, other: 'ChessBoard') -> bool:
         """
@@ -186,11 +299,7 @@ class ChessBoard:
         if self.size != other.size:
             raise ValueError("Two chessboards of different sizes")
 
-        for i in range(self.size):
-            for j in range(self.size):
-                if other.board[i, j] != 0 and self.board[i, j] == 0:
-                    return True
-        return False
+        return bool(np.any((other.board != 0) & (self.board == 0)))
 
     def is_game_over(self) -> int:
         """
@@ -200,41 +309,9 @@ class ChessBoard:
             BLACK(1) - 黑方获胜
             WHITE(2) - 白方获胜
         """
-        # 检查所有可能的位置
-        for i in range(self.size):
-            for j in range(self.size):
-                if self.board[i, j] == 0:
-                    continue
-
-                current_color = self.board[i, j]
-
-                if j + 4 < self.size:
-                    if (self.board[i, j + 1] == current_color and
-                            self.board[i, j + 2] == current_color and
-                            self.board[i, j + 3] == current_color and
-                            self.board[i, j + 4] == current_color):
-                        return current_color
-
-                if i + 4 < self.size:
-                    if (self.board[i + 1, j] == current_color and
-                            self.board[i + 2, j] == current_color and
-                            self.board[i + 3, j] == current_color and
-                            self.board[i + 4, j] == current_color):
-                        return current_color
-
-                if i + 4 < self.size and j + 4 < self.size:
-                    if (self.board[i + 1, j + 1] == current_color and
-                            self.board[i + 2, j + 2] == current_color and
-                            self.board[i + 3, j + 3] == current_color and
-                            self.board[i + 4, j + 4] == current_color):
-                        return current_color
-
-                if i + 4 < self.size and j - 4 >= 0:
-                    if (self.board[i + 1, j - 1] == current_color and
-                            self.board[i + 2, j - 2] == current_color and
-                            self.board[i + 3, j - 3] == current_color and
-                            self.board[i + 4, j - 4] == current_color):
-                        return current_color
+        for chess in (BLACK, WHITE):
+            if _has_five(self.board == chess):
+                return chess
 
         if np.count_nonzero(self.board) == self.size * self.size:
             return -1
@@ -245,14 +322,19 @@ class ChessBoard:
         """
         判断当前棋盘是否为空（无任何落子）,如果棋盘为空（所有位置都是0）则返回True，否则返回False
         """
-        return np.all(self.board == 0)
+        return self._black_count + self._white_count == 0
 
-    def get_hash(self) -> str:
+    def get_hash(self) -> int:
         """
-        生成当前棋盘状态的唯一hash值
+        返回当前棋盘状态的Zobrist hash值，落子/提子时增量更新，读取为O(1)
         """
-        board_bytes = self.board.tobytes()
-        return hashlib.md5(board_bytes).hexdigest()
+        return self._hash
+
+    def get_version(self) -> int:
+        """
+        返回棋盘版本号，棋盘内容每次变化后递增
+        """
+        return self._version
 
 
 @dataclass
@@ -263,5 +345,21 @@ class MoveItem:
     weight: int
     winrate: float
 
+    def label_text(self) -> str:
+        """棋盘上落子圈内显示的文字：访问数与胜率"""
+        return _format_move_label(self.visits, self.winrate)
+
     def __str__(self):
-        return f"Move{self.move}({self.gtp}): v{self.visits} w{self.weight} {self.winrate:.1%}"
+        return _format_move_item(self.move, self.gtp, self.visits, self.weight, self.winrate)
+
+
+@lru_cache(maxsize=256)
+def _format_move_item(move, gtp, visits, weight, winrate) -> str:
+    # 界面每次重绘都会格式化推荐落子列表，而该列表在相邻几次重绘之间通常不变
+    return f"Move{move}({gtp}): v{visits} w{weight} {winrate:.1%}"
+
+
+@lru_cache(maxsize=256)
+def _format_move_label(visits, winrate) -> str:
+    # 结果缓存在模块级而非实例上，MoveItem 的 __dict__ 只包含数据字段，序列化结果与是否绘制过无关
+    return f"{visits}\n{winrate:.2%}"
@@ -1,10 +1,16 @@
+import logging
 from abc import ABC, abstractmethod
 from typing import Optional, Tuple
 
-import cv2
 import numpy as np
 
-from src.engine.board import ChessBoard, BLACK, WHITE
+from src.engine.board import ChessBoard, BLACK, WHITE, BOARD_DTYPE
+
+
+# BT.601 灰度权重（与 cv2.COLOR_BGR2GRAY 一致），按 B、G、R 顺序
+BGR_TO_GRAY = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+# 单通道灰度图的"权重"，使 Numba 内核对灰度图与彩色图使用同一实现
+GRAY_WEIGHT = np.ones(1, dtype=np.float32)
 
 
 class BoardRecognizer(ABC):
@@ -42,6 +48,7 @@ class AdvancedBoardRecognizer(BoardRecognizer):
             "parameters": self.config.copy()
         }
         self.intersection_points = None
+        self.kernel = None
 
     def initialize(self, model_path: Optional[str] = None, config: dict = None) -> bool:
         if config:
@@ -49,6 +56,28 @@ class AdvancedBoardRecognizer(BoardRecognizer):
             self.info["parameters"] = self.config.copy()
 
         self._calculate_intersection_points()
+
+        # recognize 每帧都会用到的参数预先取出，避免逐帧字典查找
+        self._grid_size = int(self.config["grid_size"])
+        self._image_size = int(self.config["image_size"])
+        self._black_threshold = float(self.config["black_threshold"])
+        self._white_threshold = float(self.config["white_threshold"])
+
+        # 重新初始化时按新配置重新选择内核
+        self.kernel = None
+        if self.config.get("kernel", "numpy") == "numba":
+            try:
+                from src.engine.recognizer_kernel import classify_board_u8
+                grid_size = self.config["grid_size"]
+                # 预热一次，避免首帧识别触发JIT编译
+                classify_board_u8(np.zeros((1, 1, 4), dtype=np.uint8),
+                                  np.zeros_like(self.roi_y_index), np.zeros_like(self.roi_x_index),
+                                  BGR_TO_GRAY, 0.0, 1.0, np.empty((grid_size, grid_size), dtype=BOARD_DTYPE))
+                self.kernel = classify_board_u8
+            except Exception as e:
+                # numba 是可选依赖，不可用时退回 NumPy 实现
+                logging.warning(f"Numba recognizer kernel initialization failed, fall back to numpy: {e}")
+
         self.initialized = True
         return True
 
@@ -67,49 +96,62 @@ class AdvancedBoardRecognizer(BoardRecognizer):
                 y = int(start + i * cell_size)
                 self.intersection_points[i, j] = (x, y)
 
+        # 预先计算每行/每列交叉点ROI的采样坐标，形状为 (grid_size, 2r+1)，
+        # recognize 时通过广播索引一次性取出全部 grid_size x grid_size 个ROI
+        roi_radius = int(self.config["piece_size"] * 0.4)
+        offsets = np.arange(-roi_radius, roi_radius + 1)
+        max_index = self.config["image_size"] - 1
+        self.roi_y_index = np.clip(self.intersection_points[:, 0, 1, None] + offsets, 0, max_index)
+        self.roi_x_index = np.clip(self.intersection_points[0, :, 0, None] + offsets, 0, max_index)
+
     def recognize(self, image: np.ndarray) -> Tuple[Optional[ChessBoard], dict]:
         if not self.initialized:
             return None, {"confidence": 0.0, "error": "Recognizer not initialized"}
 
-        if image.shape[0] != self.config["image_size"] or image.shape[1] != self.config["image_size"]:
+        image_size = self._image_size
+        if image.shape[0] != image_size or image.shape[1] != image_size:
             return None, {"confidence": 0.0,
-                          "error": f"Image size must be {self.config['image_size']}x{self.config['image_size']}"}
+                          "error": f"Image size must be {image_size}x{image_size}"}
 
         try:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
-
-            board_size = self.config["grid_size"]
-            board_state = ChessBoard(size=board_size)
-            total_confidence = 0.0
-            piece_count = 0
-
-            roi_radius = int(self.config["piece_size"] * 0.4)
-            for i in range(self.config["grid_size"]):
-                for j in range(self.config["grid_size"]):
-                    x, y = self.intersection_points[i, j]
-                    roi = self._get_roi(gray, (x, y), roi_radius)
-                    if roi.size == 0:
-                        continue
-
-                    avg_brightness = np.mean(roi) / 255.0
-
-                    if avg_brightness < self.config["black_threshold"]:
-                        board_state.place_piece(i, j, BLACK)
-                        total_confidence += 0.95
-                        piece_count += 1
-                    elif avg_brightness > self.config["white_threshold"]:
-                        board_state.place_piece(i, j, WHITE)
-                        total_confidence += 0.95
-                        piece_count += 1
+            board_size = self._grid_size
+            # 每帧新建结果数组，直接交给 ChessBoard 持有，无需再复制
+            board = np.zeros((board_size, board_size), dtype=BOARD_DTYPE)
+
+            if self.kernel is not None:
+                # 内核只读取交叉点ROI，在其中按BGR权重求亮度，与NumPy路径一致，不做整幅图像的灰度转换
+                if image.ndim == 2:
+                    pixels, weights = image[..., None], GRAY_WEIGHT
+                else:
+                    pixels, weights = image, BGR_TO_GRAY
+                self.kernel(pixels, self.roi_y_index, self.roi_x_index, weights,
+                            self._black_threshold, self._white_threshold, board)
+            else:
+                # 先从原图取出所有交叉点ROI，不对整幅图像做灰度转换
+                # rois: (grid_size, grid_size, 2r+1, 2r+1[, 通道])
+                rois = image[self.roi_y_index[:, None, :, None], self.roi_x_index[None, :, None, :]]
+                avg_brightness = rois.mean(axis=(2, 3), dtype=np.float32)
+                if avg_brightness.ndim == 3:
+                    # 灰度是各通道的线性组合，先求各通道均值再加权，等价于先转灰度再求均值
+                    avg_brightness = avg_brightness[..., :3] @ BGR_TO_GRAY
+                avg_brightness *= 1 / 255.0
+
+                board[avg_brightness > self._white_threshold] = WHITE
+                board[avg_brightness < self._black_threshold] = BLACK
+            board_state = ChessBoard(size=board_size, board=board)
+            black_count = board_state.count_pieces(BLACK)
+            white_count = board_state.count_pieces(WHITE)
+            piece_count = black_count + white_count
+            total_confidence = 0.95 * piece_count
 
             total_cells = board_size * board_size
             avg_confidence = total_confidence / total_cells if total_cells > 0 else 0
 
             meta_info = {
                 "confidence": round(avg_confidence, 3),
-                "piece_count": board_state.count_pieces(BLACK) + board_state.count_pieces(WHITE),
-                "black_count": board_state.count_pieces(BLACK),
-                "white_count": board_state.count_pieces(WHITE),
+                "piece_count": piece_count,
+                "black_count": black_count,
+                "white_count": white_count,
                 "image_size": (image.shape[1], image.shape[0]),
                 "parameters_used": self.config.copy()
             }
@@ -119,16 +161,5 @@ class AdvancedBoardRecognizer(BoardRecognizer):
         except Exception as e:
             return None, {"confidence": 0.0, "error": str(e)}
 
-    def _get_roi(self, image: np.ndarray, center: Tuple[int, int], radius: int) -> np.ndarray:
-        x, y = center
-        height, width = image.shape[:2]
-
-        x1 = max(0, x - radius)
-        x2 = min(width, x + radius + 1)
-        y1 = max(0, y - radius)
-        y2 = min(height, y + radius + 1)
-
-        return image[y1:y2, x1:x2]
-
     def get_recognizer_info(self) -> dict:
         return self.info
@@ -32,28 +32,53 @@ class ScreenCapture(ImageCapture):
     def __init__(self):
         self.monitor_region = None
         self.capture_tool = None
+        self.tool = None
+        # dxgi 模式下画面未变化时 grab 返回None，此时沿用上一帧
+        self._last_frame = None
 
     def initialize(self, config: dict) -> bool:
         try:
-            if config.get("tool", "mss") == "mss":
+            self.monitor_region = config.get("region", {"top": 0, "left": 0, "width": 800, "height": 600})
+            tool = config.get("tool", "mss")
+            if tool == "mss":
                 import mss
                 self.capture_tool = mss.mss()
+            elif tool == "dxgi":
+                # Windows Desktop Duplication：直接从合成后的桌面画面中读取，不经过GDI的BitBlt
+                import dxcam
+                self.capture_tool = dxcam.create(output_color="BGRA")
+                self._dxgi_region = (
+                    self.monitor_region["left"],
+                    self.monitor_region["top"],
+                    self.monitor_region["left"] + self.monitor_region["width"],
+                    self.monitor_region["top"] + self.monitor_region["height"],
+                )
             else:
                 import pyautogui
                 self.capture_tool = pyautogui
-
-            self.monitor_region = config.get("region", {"top": 0, "left": 0, "width": 800, "height": 600})
+                tool = "pyautogui"
+            self.tool = tool
             return True
         except Exception as e:
             logging.info(f"ScreenCapture initialization failed: {e}")
             return False
 
     def capture_frame(self) -> Optional[np.ndarray]:
+        """
+        复用 initialize 中创建的 mss 实例截图，不在每帧重新创建（避免反复申请GDI句柄）
+        mss 实例绑定创建它的线程，须与 initialize 在同一线程中调用，非线程安全
+        """
         try:
-            if hasattr(self.capture_tool, "grab"):
-                # 使用mss
+            if self.tool == "dxgi":
+                # 与mss一样返回BGRA数组，桌面没有新画面时沿用上一帧
+                frame = self.capture_tool.grab(region=self._dxgi_region)
+                if frame is not None:
+                    self._last_frame = frame
+                return self._last_frame
+            elif self.tool == "mss":
+                # 使用mss：直接把BGRA原始缓冲区包装为数组，避免通用数组转换路径的逐帧拷贝
                 screenshot = self.capture_tool.grab(self.monitor_region)
-                return np.array(screenshot)
+                return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
             else:
                 # 使用pyautogui
                 screenshot = self.capture_tool.screenshot(region=(
@@ -62,7 +87,7 @@ class ScreenCapture(ImageCapture):
                     self.monitor_region["width"],
                     self.monitor_region["height"]
                 ))
-                return np.array(screenshot)
+                return np.asarray(screenshot)
         except Exception as e:
             logging.info(f"Screenshot failed: {e}")
             return None
@@ -71,9 +96,11 @@ class ScreenCapture(ImageCapture):
         return {
             "type": "screen_capture",
             "region": self.monitor_region,
-            "tool": "mss" if hasattr(self.capture_tool, "grab") else "pyautogui"
+            "tool": self.tool
         }
 
     def release(self):
-        if hasattr(self.capture_tool, "close"):
+        if self.tool == "dxgi":
+            self.capture_tool.release()
+        elif hasattr(self.capture_tool, "close"):
             self.capture_tool.close()
@@ -0,0 +1,33 @@
+"""
+棋盘识别的 Numba 加速内核，仅在识别器配置 kernel="numba" 时按需导入
+"""
+from numba import njit, prange
+
+from src.engine.board import BLACK, WHITE
+
+
+@njit(cache=True, nogil=True, fastmath=True, boundscheck=False, parallel=True)
+def classify_board_u8(image, roi_y_index, roi_x_index, weights, black_threshold, white_threshold, out):
+    """
+    统计每个交叉点ROI的平均亮度并按阈值写入 out (grid_size x grid_size, int8)，
+    0=空, 1=黑子, 2=白子；按行并行，各行之间互不依赖
+    image 为 (高, 宽, 通道) 的uint8图像，亮度按 weights 对前 len(weights) 个通道的均值加权，
+    只读取ROI内的像素，不对整幅图像做灰度转换
+    """
+    grid_size = roi_y_index.shape[0]
+    roi_len = roi_y_index.shape[1]
+    channels = weights.shape[0]
+    scale = 1.0 / (roi_len * roi_len * 255.0)
+    for i in prange(grid_size):
+        for j in range(grid_size):
+            brightness = 0.0
+            for c in range(channels):
+                total = 0
+                for k in range(roi_len):
+                    y = roi_y_index[i, k]
+                    for m in range(roi_len):
+                        total += image[y, roi_x_index[j, m], c]
+                brightness += weights[c] * total
+            avg_brightness = brightness * scale
+            out[i, j] = BLACK * (avg_brightness < black_threshold) + WHITE * (avg_brightness > white_threshold)
+    return out
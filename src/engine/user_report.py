@@ -3,12 +3,11 @@ import logging
 import sys
 import threading
 import time
-import traceback
 from abc import ABC, abstractmethod
 from typing import Optional, Tuple, Any, List
 import numpy as np
-from PyQt5.QtCore import Qt, QPoint, QTimer, QRect, QRectF
-from PyQt5.QtGui import QPainter, QPen, QColor, QBrush, QFont
+from PyQt5.QtCore import Qt, QPoint, QTimer, QRect, QRectF, QObject, pyqtSignal
+from PyQt5.QtGui import QPainter, QPen, QColor, QBrush, QFont, QFontMetrics, QPixmap
 from PyQt5.QtWidgets import QApplication, QWidget
 
 from src.engine.board import ChessBoard, BLACK, WHITE, MoveItem
@@ -56,6 +55,11 @@ class UserReport:
         pass
 
 
+class _StateNotifier(QObject):
+    """在界面线程中创建，分析线程发射信号时由Qt排队投递到界面线程"""
+    state_changed = pyqtSignal()
+
+
 class QTReport(UserReport):
     config = {
         "top": 0,  # 棋盘距离屏幕顶部距离
@@ -73,6 +77,18 @@ class QTReport(UserReport):
         self.event_loop_thread = None
         self.overlay = None
         self.best_moves: List[MoveItem] = []
+        self.info_text: Optional[str] = None
+        # 棋盘或推荐落子变化时递增，界面据此判断是否需要重新绘制
+        self.state_version = 0
+        # update() 在分析线程中调用，只在这里记录哪些内容变了（信息栏、新旧推荐落子），
+        # 重绘区域由界面线程的定时器根据窗口几何计算后统一提交
+        self._panel_dirty = False
+        self._dirty_moves: List[MoveItem] = []
+        self._dirty_lock = threading.Lock()
+        self._update_timer = None
+        self._notifier = None
+        # 用户请求立即重新识别时置位，主循环在两次截图之间等待该事件而不是固定sleep
+        self.refresh_event = threading.Event()
         self.app = None
         if not QApplication.instance():
             self.app = QApplication(sys.argv)
@@ -84,6 +100,13 @@ class QTReport(UserReport):
             self.config.update(config)
 
         self.overlay = OverlayWindow(self)
+        # 单次触发、间隔为0：多次 update() 在下一轮事件循环前只提交一次重绘
+        self._update_timer = QTimer()
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(0)
+        self._update_timer.timeout.connect(self._flush_updates)
+        self._notifier = _StateNotifier()
+        self._notifier.state_changed.connect(self._update_timer.start, Qt.QueuedConnection)
         return True
 
     def update(self,
@@ -93,13 +116,57 @@ class QTReport(UserReport):
                analysis_info: dict) -> bool:
         if not self.overlay:
             self.initialize()
+        changed = (self.board_state is None or best_move != self.best_moves or
+                   board_state.get_hash() != self.board_state.get_hash())
+        old_moves = self.best_moves
         self.board_state = board_state
         self.best_moves = best_move
         self.analysis_info = analysis_info
 
-        self.overlay.update()
+        if changed:
+            self.info_text = self._build_info_text()
+            self.state_version += 1
+            # 只重绘发生变化的区域：右侧信息栏，以及新旧推荐落子所在的圈
+            with self._dirty_lock:
+                self._panel_dirty = True
+                if best_move != old_moves:
+                    self._dirty_moves.extend(old_moves)
+                    self._dirty_moves.extend(best_move)
+            # 不在分析线程中直接操作窗口，通过信号排队到界面线程启动定时器
+            self._notifier.state_changed.emit()
         return True
 
+    def _build_info_text(self) -> Optional[str]:
+        """
+        右侧信息栏文字只随状态变化，在 update() 中生成一次，绘制时直接使用；棋盘非法时返回None
+        """
+        try:
+            player_info = "黑方" if self.board_state.determine_current_player() == BLACK else "白方"
+        except ValueError as e:
+            logging.info(f"Text drawing error: {str(e)}")
+            return None
+        board_text = self.board_state.render_numpy_board()
+        gtp_text = "".join(f"{item}\n" for item in self.best_moves)
+        return f"{board_text}\n当前执棋: {player_info}\n{gtp_text}"
+
+    def _flush_updates(self):
+        with self._dirty_lock:
+            panel_dirty, self._panel_dirty = self._panel_dirty, False
+            dirty_moves, self._dirty_moves = self._dirty_moves, []
+        if not self.overlay:
+            return
+        # 在界面线程中读取窗口几何与落子几何缓存，分析线程不接触任何窗口对象
+        if panel_dirty:
+            self.overlay.update(self.overlay.panel_rect())
+        for item in dirty_moves:
+            self.overlay.update(self.overlay.move_rect(item))
+
+    def request_refresh(self):
+        """
+        唤醒主循环，跳过最小识别间隔与画面变化判断，立即截图识别一次
+        """
+        self.refresh_event.set()
+
     def get_user_input(self) -> Optional[dict]:
         return None
 
@@ -116,6 +183,10 @@ class OverlayWindow(QWidget):
     def __init__(self, report: QTReport):
         super().__init__()
         self.report = report
+        # 离屏缓存上一次绘制的完整画面，状态未变化时直接贴图
+        self._cache_pixmap: Optional[QPixmap] = None
+        self._cache_version = -1
+        self._geometry_cache = {}
         self.init_ui()
 
     def init_ui(self):
@@ -125,6 +196,23 @@ class OverlayWindow(QWidget):
             Qt.Tool
         )
         self.setAttribute(Qt.WA_TranslucentBackground)
+        # paintEvent 总会用缓存画面（没有推荐落子时为全透明）覆盖全部重绘区域，不需要Qt先填充背景
+        self.setAttribute(Qt.WA_NoSystemBackground)
+
+        # 绘制落子圈用到的画笔、画刷、字体每帧都相同，只创建一次；圈的颜色按胜率在绘制时设置
+        self._ring_pen = QPen()
+        self._ring_pen.setWidth(3)
+        self._ring_pen.setStyle(Qt.DashLine)
+        self._empty_brush = QBrush(QColor(0, 0, 0, 0))
+        self._move_text_pen = QPen(QColor(0, 255, 0, 255))
+        self._move_font = QFont(self.font())
+        self._move_font.setPointSize(8)
+        # 右侧信息栏用到的画笔、字体、背景色
+        self._info_pen = QPen(QColor(0, 0, 0))
+        self._info_font = QFont()
+        self._info_font.setPointSize(12)
+        self._info_metrics = QFontMetrics(self._info_font)
+        self._info_background = QColor(255, 255, 255, 200)
 
         self.setGeometry(
             self.report.config["left"],
@@ -134,88 +222,110 @@ class OverlayWindow(QWidget):
         )
         self.show()
 
+    def mouseDoubleClickEvent(self, event):
+        # 双击右侧信息栏请求立即重新识别（透明区域的点击会穿透到游戏窗口）
+        self.report.request_refresh()
+
     def paintEvent(self, event):
-        if len(self.report.best_moves) == 0:
-            return
+        ratio = self.devicePixelRatioF()
+        if (self._cache_pixmap is None or self._cache_version != self.report.state_version or
+                self._cache_pixmap.size() != self.size() * ratio):
+            pixmap = QPixmap(self.size() * ratio)
+            pixmap.setDevicePixelRatio(ratio)
+            pixmap.fill(Qt.transparent)
+            # 没有推荐落子时不绘制任何内容，仍然贴上透明画面，擦除上一局残留的圈与信息栏
+            if self.report.best_moves:
+                painter = QPainter(pixmap)
+                self._render(painter)
+                painter.end()
+            self._cache_pixmap = pixmap
+            self._cache_version = self.report.state_version
 
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
-
-        for item in self.report.best_moves:
-            x, y = item.move
-            config = self.report.config
+        # 直接覆盖而非叠加，局部重绘时旧的圈会被缓存中的透明像素擦除
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        # 只从缓存中拷贝本次需要重绘的区域；缓存按设备像素存储，源区域需乘以缩放比例
+        for rect in event.region().rects():
+            source = QRectF(rect.x() * ratio, rect.y() * ratio, rect.width() * ratio, rect.height() * ratio)
+            painter.drawPixmap(QRectF(rect), self._cache_pixmap, source)
+        painter.end()
+
+    def _move_geometry(self, move: Tuple[int, int]) -> Tuple[QPoint, int, QRectF, QRect]:
+        """
+        推荐落子的绘制几何：(圈心, 半径, 文字区域, 含画笔宽度的重绘区域)
+        只取决于落子坐标与格子/棋子尺寸，按这三者缓存，配置变化时自然失效
+        """
+        config = self.report.config
+        key = (move, config["cell_size"], config["piece_size"])
+        geometry = self._geometry_cache.get(key)
+        if geometry is None:
+            x, y = move
             center_x = config["piece_size"] / 2 + config["cell_size"] * x
             center_y = config["piece_size"] / 2 + config["cell_size"] * y
             radius = config["piece_size"] / 2
-
-            pen = QPen(get_win_rate_color(item.winrate))
-            pen.setWidth(3)
-            pen.setStyle(Qt.DashLine)
-            painter.setPen(pen)
-
-            painter.setBrush(QBrush(QColor(0, 0, 0, 0)))
-
-            painter.drawEllipse(
+            margin = self._ring_pen.width()
+            geometry = (
                 QPoint(int(center_y), int(center_x)),
                 int(radius),
-                int(radius)
+                QRectF(center_y - radius, center_x - radius, radius * 2, radius * 2),
+                QRect(int(center_y - radius) - margin, int(center_x - radius) - margin,
+                      int(radius * 2) + margin * 2, int(radius * 2) + margin * 2),
             )
+            self._geometry_cache[key] = geometry
+        return geometry
 
-            text_pen = QPen(QColor(0, 255, 0, 255))
-            painter.setPen(text_pen)
+    def move_rect(self, item: MoveItem) -> QRect:
+        """
+        推荐落子的圈及文字所占区域（含画笔宽度）
+        """
+        return self._move_geometry(item.move)[3]
+
+    def panel_rect(self) -> QRect:
+        """
+        右侧信息栏所在区域
+        """
+        left = self.report.config["image_size"]
+        return QRect(left, 0, self.width() - left, self.height())
 
-            font = painter.font()
-            font.setPointSize(8)
-            painter.setFont(font)
+    def _render(self, painter: QPainter):
+        painter.setRenderHint(QPainter.Antialiasing)
 
-            text = f"{item.visits}\n{item.winrate:.2%}"
+        for item in self.report.best_moves:
+            center, radius, text_rect, _ = self._move_geometry(item.move)
 
-            text_rect = QRectF(
-                center_y - radius,
-                center_x - radius,
-                radius * 2,
-                radius * 2
-            )
+            self._ring_pen.setColor(get_win_rate_color(item.winrate))
+            painter.setPen(self._ring_pen)
+
+            painter.setBrush(self._empty_brush)
+
+            painter.drawEllipse(center, radius, radius)
+
+            painter.setPen(self._move_text_pen)
+            painter.setFont(self._move_font)
 
             painter.drawText(
                 text_rect,
                 Qt.AlignCenter,
-                text
+                item.label_text()
             )
 
+        text = self.report.info_text
+        if text is None:
+            return
         left = self.report.config["image_size"]
         top = 0
-        try:
-            text_pen = QPen(QColor(0, 0, 0))
-            painter.setPen(text_pen)
-
-            font = QFont()
-            font.setPointSize(12)
-            painter.setFont(font)
-
-            player_info = "黑方" if self.report.board_state.determine_current_player() == BLACK else "白方"
-
-            board_text = self.report.board_state.render_numpy_board()
-
-            gtp_text = ""
-            for item in self.report.best_moves:
-                gtp_text = gtp_text + str(item) + "\n"
-
-            text = f"{board_text}\n当前执棋: {player_info}\n{gtp_text}"
-
-            text_rect = painter.boundingRect(QRect(left, top, 400, 300),
-                                             Qt.AlignLeft | Qt.AlignTop,
-                                             text)
+        painter.setPen(self._info_pen)
+        painter.setFont(self._info_font)
 
-            rect_width = text_rect.width() + 20
-            rect_height = text_rect.height() + 20
-            rect = QRect(left, top, rect_width, rect_height)
+        text_rect = self._info_metrics.boundingRect(QRect(left, top, 400, 300),
+                                                    Qt.AlignLeft | Qt.AlignTop,
+                                                    text)
 
-            painter.fillRect(rect, QColor(255, 255, 255, 200))
-            painter.drawRect(rect)
+        rect_width = text_rect.width() + 20
+        rect_height = text_rect.height() + 20
+        rect = QRect(left, top, rect_width, rect_height)
 
-            painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop, text)
+        painter.fillRect(rect, self._info_background)
+        painter.drawRect(rect)
 
-        except Exception as e:
-            traceback.print_exc()
-            logging.info(f"Text drawing error: {str(e)}")
\ No newline at end of file
+        painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop, text)
\ No newline at end of file
@@ -1,7 +1,16 @@
+import itertools
 import json
 import logging
 import os
+import pickle
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 
 import cv2
@@ -9,29 +18,67 @@ import numpy as np
 from PIL import Image
 from PyQt5.QtGui import QColor
 
-from src.engine.board import BLACK, WHITE
-from cachetools import LRUCache
+from src.engine.board import BLACK, WHITE, GTP_COLUMNS
+from cachetools import Cache, LRUCache
 
+logger = logging.getLogger(__name__)
 
-def to_ndarray(image_path: str) -> Optional[np.ndarray]:
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# PNG压缩是单线程的CPU密集操作，后台保存时放到这里执行
+_SAVE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="save_ndarray")
+_SAVE_COUNTER = itertools.count()
+_FAST_PNG_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1, cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE]
+
+
+def to_ndarray(image_path: str, bgr: bool = False) -> Optional[np.ndarray]:
     """
     将本地图片文件转换为 Optional[np.ndarray]
+    默认返回RGB顺序；bgr 为True时返回OpenCV的BGR顺序，之后直接交给cv2处理或保存时省去两次通道转换
     """
     try:
-        if not os.path.exists(image_path):
-            logging.info(f"Error: File does not exist - {image_path}")
-            return None
+        # 先按字节读入再由OpenCV在C层解码，np.fromfile 也能处理Windows下的非ASCII路径
+        image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            return image if bgr else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # OpenCV不支持的格式交给PIL再试一次
         image = Image.open(image_path)
         if image.mode != 'RGB':
             image = image.convert('RGB')
-        image_array = np.array(image)
-        return image_array
+        image_array = np.asarray(image)
+        return cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR) if bgr else image_array
 
+    except FileNotFoundError:
+        logger.info("Error: File does not exist - %s", image_path)
+        return None
     except Exception as e:
-        logging.error(f"Error converting image: {e}")
+        logger.error("Error converting image: %s", e)
         return None
 
 
+def to_ndarray_cached(image_path: str, bgr: bool = False) -> Optional[np.ndarray]:
+    """
+    与 to_ndarray 相同，但解码结果缓存到同目录的 .npy 文件中，之后以内存映射方式只读加载，无需再次解码
+    图片比缓存新时重新解码；返回的数组可能是只读的，需要修改时请先 copy()
+    """
+    cache_path = f"{image_path}.{'bgr' if bgr else 'rgb'}.npy"
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(image_path):
+            return np.load(cache_path, mmap_mode='r')
+    except OSError:
+        pass
+    image = to_ndarray(image_path, bgr=bgr)
+    if image is not None:
+        try:
+            np.save(cache_path, image)
+        except OSError as e:
+            logger.info("Failed to cache decoded image: %s", e)
+    return image
+
+
 def crop_ndarray(
         image: Optional[np.ndarray],
         left: int,
@@ -42,166 +89,226 @@ def crop_ndarray(
     """
     根据给定的区域参数裁剪图像
     """
-    # 检查输入是否为None
     if image is None:
         return None
 
     if not isinstance(image, np.ndarray):
-        logging.info("Error: Input is not a numpy array")
+        logger.info("Error: Input is not a numpy array")
         return None
 
-    if image.ndim not in [2, 3]:
-        logging.info("Error: Unsupported image dimension")
+    if image.ndim not in (2, 3):
+        logger.info("Error: Unsupported image dimension")
         return None
 
-    img_height, img_width = image.shape[:2]
-
     if left < 0 or top < 0 or width <= 0 or height <= 0:
-        logging.info("Error: Crop parameter is invalid")
+        logger.info("Error: Crop parameter is invalid")
         return None
 
-    right = left + width
-    bottom = top + height
-
+    img_height, img_width = image.shape[:2]
     if left >= img_width or top >= img_height:
-        logging.info("Error: Crop area completely beyond image boundary")
+        logger.info("Error: Crop area completely beyond image boundary")
         return None
 
-    adj_left = max(0, left)
-    adj_top = max(0, top)
-    adj_right = min(img_width, right)
-    adj_bottom = min(img_height, bottom)
-    adj_width = adj_right - adj_left
-    adj_height = adj_bottom - adj_top
-    if adj_width <= 0 or adj_height <= 0:
-        logging.info("Error: The adjusted cropping area is invalid")
-        return None
-    try:
-        if image.ndim == 2:
-            cropped = image[adj_top:adj_bottom, adj_left:adj_right]
-        else:
-            cropped = image[adj_top:adj_bottom, adj_left:adj_right, :]
-        return cropped
-    except Exception as e:
-        logging.error(f"Error cropping image: {e}")
-        return None
+    # 参数已保证 left/top 非负且落在图像内，只需把右下边界截断到图像范围
+    right = min(img_width, left + width)
+    bottom = min(img_height, top + height)
+    if right - left == img_width and bottom - top == img_height:
+        # 裁剪区域覆盖整幅图像时直接返回原数组
+        return image
+    # 对2维灰度图和3维彩色图同样适用，返回的是视图，不复制像素
+    return image[top:bottom, left:right]
 
 
 def save_ndarray(image: Optional[np.ndarray],
                  folder_path: str,
                  filename: Optional[str] = None,
-                 default_name: str = "board_image") -> bool:
+                 default_name: str = "board_image",
+                 background: bool = False,
+                 raw: bool = False,
+                 fast: bool = True) -> bool:
     """
     将可能为空的numpy数组图像保存到本地文件夹
+    background 为True时编码与写盘交给后台线程，立即返回True，保存结果只记录在日志中
+    raw 为True时不做图像编码，按原始数组保存为同名 .npy 文件（可用 np.load 读回），适合调试时频繁保存
+    fast 为True时PNG使用最低压缩级别与RLE策略，棋盘截图大面积纯色，编码快数倍而文件只略大；需要较小文件时传False
     """
     if image is None:
-        logging.info("The image is empty and cannot be saved")
+        logger.info("The image is empty and cannot be saved")
         return False
 
     os.makedirs(folder_path, exist_ok=True)
 
     if filename is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{default_name}_{timestamp}.png"
+        # 秒级时间戳在一秒内多次保存时会重名，追加进程内递增序号
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        filename = f"{default_name}_{timestamp}_{next(_SAVE_COUNTER)}.png"
     else:
         if not filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
             filename += '.png'
 
     file_path = os.path.join(folder_path, filename)
+    if raw:
+        file_path = os.path.splitext(file_path)[0] + ".npy"
+        write, params = _write_raw, None
+    else:
+        write, params = _write_image, _FAST_PNG_PARAMS if fast and file_path.lower().endswith('.png') else []
+
+    if background:
+        # 复制一份，避免调用方在编码完成前复用或修改该缓冲区
+        _SAVE_POOL.submit(write, file_path, image.copy(), params)
+        return True
+    return write(file_path, image, params)
+
 
+def _write_image(file_path: str, image: np.ndarray, params) -> bool:
     try:
-        success = cv2.imwrite(file_path, image)
+        success = cv2.imwrite(file_path, image, params)
         if success:
-            logging.info(f"The image has been successfully saved to: {file_path}")
+            logger.info("The image has been successfully saved to: %s", file_path)
             return True
         else:
-            logging.error(f"Failed to save image: {file_path}")
+            logger.error("Failed to save image: %s", file_path)
             return False
     except Exception as e:
-        logging.error(f"An error occurred while saving the image: {str(e)}")
+        logger.error("An error occurred while saving the image: %s", e)
+        return False
+
+
+def _write_raw(file_path: str, image: np.ndarray, params=None) -> bool:
+    try:
+        np.save(file_path, image)
+        logger.info("The image has been successfully saved to: %s", file_path)
+        return True
+    except Exception as e:
+        logger.error("An error occurred while saving the image: %s", e)
         return False
 
 
+@lru_cache(maxsize=8)
+def _gtp_tables(size):
+    """
+    按棋盘尺寸预先生成坐标互查表：(GTP坐标 -> (行, 列), names[行][列] -> GTP坐标)
+    """
+    names = tuple(tuple(f"{GTP_COLUMNS[col]}{size - row}" for col in range(size)) for row in range(size))
+    index = {names[row][col]: (row, col) for row in range(size) for col in range(size)}
+    return index, names
+
+
 def gtp_2_np(gtp, size):
-    column_letter = gtp[0].upper()
-    row_number = int(gtp[1:])
-    if column_letter < 'I':
-        col = ord(column_letter) - ord('A')
-    else:
-        col = ord(column_letter) - ord('A') - 1
-    row = size - row_number
-    return row, col
+    return _gtp_tables(size)[0][gtp.upper()]
 
 
 def np_to_gtp(row, col, size):
-    gtp_row = size - row
-    if col < 8:
-        column_letter = chr(ord('A') + col)
-    else:
-        column_letter = chr(ord('A') + col + 1)
+    return _gtp_tables(size)[1][row][col]
+
 
-    return f"{column_letter}{gtp_row}"
+@lru_cache(maxsize=8)
+def gtp_coord_table(size) -> np.ndarray:
+    """
+    按棋盘尺寸生成只读的GTP坐标表，table[row, col] 为 "D4" 形式的坐标，可直接用行列数组批量取值
+    """
+    table = np.empty((size, size), dtype=object)
+    table[:] = _gtp_tables(size)[1]
+    table.flags.writeable = False
+    return table
 
 
 def chess2color(chess):
     return "B" if chess == BLACK else "W" if chess == WHITE else "PASS"
 
 
+# 胜率分档阈值与对应颜色，胜率大于第i个阈值即落入第i+1档；颜色为共享对象，调用方不应修改
+_WIN_RATE_THRESHOLDS = (0.50, 0.85, 0.95, 0.98)
+_WIN_RATE_COLORS = (
+    QColor(255, 255, 255, 200),  # 白色
+    QColor(0, 0, 255, 200),  # 蓝色
+    QColor(128, 0, 128, 200),  # 紫色
+    QColor(255, 165, 0, 200),  # 橙色
+    QColor(255, 0, 0, 200),  # 红色
+)
+
+
 def get_win_rate_color(win_rate):
     """
     根据胜率返回对应的QColor颜色对象
     """
-    if win_rate * 100 > 98:
-        return QColor(255, 0, 0, 200)  # 红色
-    elif win_rate > 95:
-        return QColor(255, 165, 0, 200)  # 橙色
-    elif win_rate > 85:
-        return QColor(128, 0, 128, 200)  # 紫色
-    elif win_rate > 50:
-        return QColor(0, 0, 255, 200)  # 蓝色
-    else:
-        return QColor(255, 255, 255, 200)  # 白色
+    return _WIN_RATE_COLORS[bisect_left(_WIN_RATE_THRESHOLDS, win_rate)]
+
+
+def _encode_datetime(obj):
+    return obj.isoformat()
+
+
+def _encode_vars(obj):
+    return obj.__dict__
 
 
 class CustomEncoder(json.JSONEncoder):
+    # 类型 -> 序列化函数，每种类型只判断一次，之后同类型对象直接查表
+    _handlers = {datetime: _encode_datetime}
+
     def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        elif hasattr(obj, '__dict__'):
-            return obj.__dict__
-        return super().default(obj)
+        handler = self._handlers.get(type(obj))
+        if handler is None:
+            if isinstance(obj, datetime):
+                handler = _encode_datetime
+            elif hasattr(obj, '__dict__'):
+                handler = _encode_vars
+            else:
+                return super().default(obj)
+            self._handlers[type(obj)] = handler
+        return handler(obj)
+
+
+def _orjson_default(obj):
+    """
+    orjson无法原生序列化的对象才会进入这里（datetime/dataclass/numpy已由orjson直接处理）
+    """
+    if hasattr(obj, '__dict__'):
+        return obj.__dict__
+    if hasattr(obj, '__slots__'):
+        return {name: getattr(obj, name) for name in obj.__slots__}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
 
 def object_to_json_with_encoder(obj, indent=None):
+    # orjson只支持2空格缩进，其余缩进或未安装orjson时回退到标准库
+    if orjson is not None and indent in (None, 2):
+        # 与标准库一致允许int等非str键；orjson输出UTF-8，等价于 ensure_ascii=False
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, default=_orjson_default, option=option).decode()
+        except TypeError:
+            # orjson不支持的输入（如超出64位的整数）交给标准库处理，行为与未安装orjson时相同
+            pass
     return json.dumps(obj, cls=CustomEncoder, indent=indent, ensure_ascii=False)
 
 
-def parse_gtp_info(gtp_output):
+# info 行中 pv/pvVisits 之后跟若干个值，直到下一个纯字母的键为止；其余键各跟一个值
+_GTP_INFO_TOKEN_RE = re.compile(r"(pvVisits|pv)(?!\S)((?:\s+(?![A-Za-z]+(?!\S))\S+)*)|(\S+)(?:\s+(\S+))?")
+
+
+@lru_cache(maxsize=128)
+def parse_gtp_info(gtp_output, limit=None):
     """
     解析围棋GTP分析命令的输出
+    结果按原始输出行缓存，KataGo重复输出相同的info行时直接复用，调用方不应修改返回值
+    limit 不为空时只解析前 limit 个候选点，其余部分不做切分
     """
-    info_entries = gtp_output.split('info ')[1:]
+    if limit is None:
+        info_entries = gtp_output.split('info ')[1:]
+    else:
+        info_entries = gtp_output.split('info ', limit + 1)[1:limit + 1]
 
     info_array = []
 
     for entry in info_entries:
-        cleaned_entry = ' '.join(entry.split())
         info_dict = {}
-        tokens = cleaned_entry.split()
-        i = 0
-
-        while i < len(tokens):
-            key = tokens[i]
-            if key in ['pv', 'pvVisits']:
-                j = i + 1
-                while j < len(tokens) and not tokens[j].isalpha():
-                    j += 1
-                info_dict[key] = tokens[i + 1:j]
-                i = j
+        for pv_key, pv_values, key, value in _GTP_INFO_TOKEN_RE.findall(entry):
+            if pv_key:
+                info_dict[pv_key] = pv_values.split()
             else:
-                info_dict[key] = tokens[i + 1] if i + 1 < len(tokens) else ""
-                i += 2
-
+                info_dict[key] = value
         info_array.append(info_dict)
 
     return info_array
@@ -216,6 +323,14 @@ class AnalyzedLRUCache(LRUCache):
         super().__init__(maxsize)
         self.hits = 0
         self.misses = 0
+        # 写入与落盘快照互斥，避免保存线程遍历时缓存被并发修改
+        self._write_lock = threading.Lock()
+        self._dirty = False
+
+    def __setitem__(self, key, value):
+        with self._write_lock:
+            super().__setitem__(key, value)
+            self._dirty = True
 
     def __getitem__(self, key):
         try:
@@ -226,14 +341,27 @@ class AnalyzedLRUCache(LRUCache):
             self.misses += 1
             raise
 
+    def popitem(self):
+        # LRUCache 淘汰时通过 self[key] 取出被淘汰的值，这次读取不是查询，不计入命中
+        hits = self.hits
+        try:
+            return super().popitem()
+        finally:
+            self.hits = hits
+
     def get(self, key, default=None):
+        # 未命中是查询新局面时的常态，先做成员判断，避免每次未命中都抛出并捕获KeyError
+        if key not in self:
+            self.misses += 1
+            return default
         try:
             value = super().__getitem__(key)
-            self.hits += 1
-            return value
         except KeyError:
+            # 成员判断之后可能恰好被其他线程的写入淘汰
             self.misses += 1
             return default
+        self.hits += 1
+        return value
 
     def get_hit_rate(self):
         total_accesses = self.hits + self.misses
@@ -247,7 +375,93 @@ class AnalyzedLRUCache(LRUCache):
 
     @classmethod
     def load_from_file(cls, chess_manual_path, maxsize):
-        return cls(maxsize)
+        """
+        从pickle文件加载历史棋谱缓存，文件不存在或损坏时返回空缓存
+        """
+        cache = cls(maxsize)
+        if not chess_manual_path or not os.path.exists(chess_manual_path):
+            return cache
+        try:
+            with open(chess_manual_path, "rb") as f:
+                entries = pickle.load(f)
+            for key, value in entries.items():
+                cache[key] = value
+            cache._dirty = False
+            logger.info("Loaded %d chess manual entries from: %s", len(cache), chess_manual_path)
+        except Exception as e:
+            logger.error("Failed to load chess manual: %s", e)
+        return cache
+
+    def _snapshot(self) -> dict:
+        """
+        按从最久未使用到最近使用的顺序复制全部条目，load_from_file 依次写入即可恢复使用顺序；
+        取值绕过 LRUCache.__getitem__，不计入命中次数，也不改变使用顺序
+        """
+        # cachetools 没有公开使用顺序，取不到时退回插入顺序
+        order = getattr(self, "_LRUCache__order", None)
+        keys = list(order) if order is not None else list(self)
+        return {key: Cache.__getitem__(self, key) for key in keys}
 
     def save_to_file(self, chess_manual_path):
-        pass
+        """
+        缓存有变化时以pickle格式写入文件，先写临时文件再替换，避免中途退出损坏原文件
+        """
+        if not chess_manual_path or not self._dirty:
+            return
+        with self._write_lock:
+            entries = self._snapshot()
+            self._dirty = False
+        tmp_path = chess_manual_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, chess_manual_path)
+        except Exception as e:
+            self._dirty = True
+            logger.error("Failed to save chess manual: %s", e)
+
+
+def set_thread_affinity(cpus) -> bool:
+    """
+    将当前线程绑定到指定的CPU核心集合；cpus 为空时不做任何修改
+    Linux下 sched_setaffinity(0) 只作用于调用线程，Windows下使用 SetThreadAffinityMask，其他平台忽略
+    """
+    if not cpus:
+        return False
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, set(cpus))
+            return True
+        if sys.platform == "win32":
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            mask = sum(1 << cpu for cpu in cpus)
+            return kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), mask) != 0
+    except (OSError, ValueError) as e:
+        logger.warning("Failed to set thread affinity %s: %s", cpus, e)
+    return False
+
+
+def set_process_affinity(pid: int, cpus) -> bool:
+    """
+    将指定进程绑定到CPU核心集合，优先使用psutil（可选依赖），未安装时Linux下退回 sched_setaffinity
+    """
+    if not cpus:
+        return False
+    try:
+        import psutil
+        psutil.Process(pid).cpu_affinity(sorted(cpus))
+        return True
+    except ImportError:
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(pid, set(cpus))
+                return True
+            except OSError as e:
+                logger.warning("Failed to set process affinity %s: %s", cpus, e)
+        else:
+            logger.warning("psutil is not installed, process affinity is not supported")
+    except (OSError, ValueError, AttributeError) as e:
+        # macOS 没有进程级核心绑定，psutil.Process 不提供 cpu_affinity
+        logger.warning("Failed to set process affinity %s: %s", cpus, e)
+    return False
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from src.engine.board import ChessBoard, BLACK, WHITE, _has_five, _zobrist_table
+
+SIZE = 15
+# 四个方向的步进 (行, 列)：横、竖、主对角线、反对角线
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+
+def legacy_has_five(board: np.ndarray, chess: int) -> bool:
+    """
+    错位切片实现之前的逐格扫描，作为对照
+    """
+    size = board.shape[0]
+    for i in range(size):
+        for j in range(size):
+            if board[i, j] != chess:
+                continue
+            for di, dj in DIRECTIONS:
+                end_i, end_j = i + 4 * di, j + 4 * dj
+                if not (0 <= end_i < size and 0 <= end_j < size):
+                    continue
+                if all(board[i + k * di, j + k * dj] == chess for k in range(1, 5)):
+                    return True
+    return False
+
+
+def line_board(start, direction, length, chess=BLACK) -> np.ndarray:
+    board = np.zeros((SIZE, SIZE), dtype=np.int8)
+    (i, j), (di, dj) = start, direction
+    for k in range(length):
+        board[i + k * di, j + k * dj] = chess
+    return board
+
+
+LINES = [
+    # 横、竖、两条斜线
+    ((7, 3), (0, 1)), ((3, 7), (1, 0)), ((3, 3), (1, 1)), ((3, 11), (1, -1)),
+    # 贴边的行与列
+    ((0, 0), (0, 1)), ((14, 10), (0, 1)), ((10, 0), (1, 0)), ((0, 14), (1, 0)),
+    # 从角落出发的两条斜线
+    ((0, 0), (1, 1)), ((10, 10), (1, 1)), ((0, 14), (1, -1)), ((10, 4), (1, -1)),
+]
+
+
+@pytest.mark.parametrize("start, direction", LINES)
+@pytest.mark.parametrize("length, expected", [(4, False), (5, True)])
+def test_has_five_lines(start, direction, length, expected):
+    board = line_board(start, direction, length)
+    assert _has_five(board == BLACK) is expected
+    assert legacy_has_five(board, BLACK) is expected
+
+
+@pytest.mark.parametrize("start, direction", [((7, 2), (0, 1)), ((2, 7), (1, 0)),
+                                              ((2, 2), (1, 1)), ((2, 12), (1, -1))])
+def test_has_five_six_in_a_row(start, direction):
+    # 长连同样包含五连
+    board = line_board(start, direction, 6)
+    assert _has_five(board == BLACK)
+    assert legacy_has_five(board, BLACK)
+
+
+def test_has_five_broken_line():
+    board = line_board((7, 3), (0, 1), 6)
+    board[7, 5] = WHITE
+    assert not _has_five(board == BLACK)
+    assert not legacy_has_five(board, BLACK)
+
+
+def test_has_five_small_board():
+    assert not _has_five(np.ones((4, 4), dtype=bool))
+
+
+def test_has_five_matches_legacy_on_random_boards():
+    rng = np.random.default_rng(2024)
+    for _ in range(500):
+        board = rng.choice(np.array([0, BLACK, WHITE], dtype=np.int8), size=(SIZE, SIZE), p=[0.4, 0.3, 0.3])
+        for chess in (BLACK, WHITE):
+            assert _has_five(board == chess) == legacy_has_five(board, chess)
+
+
+def test_is_game_over():
+    board = ChessBoard(size=SIZE, board=line_board((0, 14), (1, -1), 5, chess=WHITE))
+    assert board.is_game_over() == WHITE
+    board = ChessBoard(size=SIZE, board=line_board((0, 14), (1, -1), 4, chess=WHITE))
+    assert board.is_game_over() == 0
+
+
+@pytest.mark.parametrize("chess", [0, 3, -1])
+def test_place_piece_rejects_invalid_chess(chess):
+    board = ChessBoard(size=SIZE)
+    assert not board.place_piece(7, 7, chess)
+    assert board.get_piece(7, 7) == 0
+    assert board.get_hash() == ChessBoard(size=SIZE).get_hash()
+    assert board == ChessBoard(size=SIZE)
+
+
+def splitmix64(seed: int):
+    """
+    纯Python整数实现的splitmix64，作为Zobrist表的对照
+    """
+    mask = (1 << 64) - 1
+    while True:
+        seed = (seed + 0x9E3779B97F4A7C15) & mask
+        z = seed
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & mask
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & mask
+        yield z ^ (z >> 31)
+
+
+def test_zobrist_table_is_splitmix64():
+    # 棋谱缓存以hash为键持久化，Zobrist表必须与NumPy版本无关
+    table = _zobrist_table(SIZE)
+    generator = splitmix64(0)
+    assert table.shape == (SIZE, SIZE, 3)
+    assert table.ravel().tolist() == [next(generator) for _ in range(table.size)]
+    assert int(table[0, 0, 0]) == 0xE220A8397B1DCDAF
@@ -0,0 +1,36 @@
+import os
+
+from src.engine.util import AnalyzedLRUCache
+
+
+def test_save_keeps_stats_and_order(tmp_path):
+    cache = AnalyzedLRUCache(maxsize=3)
+    cache["a"] = 1
+    cache["b"] = 2
+    cache["c"] = 3
+    assert cache.get("a") == 1
+    hits, misses = cache.hits, cache.misses
+
+    path = os.path.join(tmp_path, "chess_manual.pkl")
+    cache.save_to_file(path)
+    # 落盘快照不计入命中，也不改变使用顺序：最久未使用的是 b
+    assert (cache.hits, cache.misses) == (hits, misses)
+    cache["d"] = 4
+    assert sorted(cache.keys()) == ["a", "c", "d"]
+    # 淘汰同样不计入命中
+    assert (cache.hits, cache.misses) == (hits, misses)
+
+
+def test_load_restores_order(tmp_path):
+    cache = AnalyzedLRUCache(maxsize=3)
+    cache["a"] = 1
+    cache["b"] = 2
+    cache["c"] = 3
+    cache.get("a")
+    path = os.path.join(tmp_path, "chess_manual.pkl")
+    cache.save_to_file(path)
+
+    loaded = AnalyzedLRUCache.load_from_file(path, maxsize=3)
+    assert loaded.hits == 0
+    loaded["d"] = 4
+    assert sorted(loaded.keys()) == ["a", "c", "d"]
@@ -0,0 +1,65 @@
+import pytest
+
+from src.engine.util import parse_gtp_info
+
+
+def legacy_parse_gtp_info(gtp_output):
+    """
+    正则实现之前的逐token解析，作为对照
+    """
+    info_entries = gtp_output.split('info ')[1:]
+
+    info_array = []
+
+    for entry in info_entries:
+        cleaned_entry = ' '.join(entry.split())
+        info_dict = {}
+        tokens = cleaned_entry.split()
+        i = 0
+
+        while i < len(tokens):
+            key = tokens[i]
+            if key in ['pv', 'pvVisits']:
+                j = i + 1
+                while j < len(tokens) and not tokens[j].isalpha():
+                    j += 1
+                info_dict[key] = tokens[i + 1:j]
+                i = j
+            else:
+                info_dict[key] = tokens[i + 1] if i + 1 < len(tokens) else ""
+                i += 2
+
+        info_array.append(info_dict)
+
+    return info_array
+
+
+GTP_OUTPUTS = [
+    # 常规输出：pv 与 pvVisits 各跟若干个值
+    "info move H8 visits 120 utility 0.12 winrate 0.55 scoreMean 0.0 prior 0.3 lcb 0.5 order 0 "
+    "pv H8 J9 G7 pvVisits 120 60 30 info move J9 visits 40 winrate 0.45 order 1 pv J9 H8",
+    # pass 是纯字母，会结束 pv 并被当作键
+    "info move pass visits 3 winrate 0.1 order 0 pv pass H8 info move H8 visits 5 order 1 pv H8 pass J9",
+    # 末尾的键没有值
+    "info move H8 visits 12 winrate 0.5 order 0 pv H8 J9 isEdge",
+    "info move H8 visits",
+    "info move H8 visits 12 order 0 pv",
+    "info move H8 visits 12 order 0 pvVisits",
+    # 多个空白字符、制表符与换行
+    "info move H8  visits\t12\norder 0 pv  H8   J9 ",
+    "= info move H8 visits 1 info move J9 visits 2 info move K10 visits 3",
+    "info ",
+    "",
+]
+
+
+@pytest.mark.parametrize("gtp_output", GTP_OUTPUTS)
+def test_parse_gtp_info_matches_legacy(gtp_output):
+    assert parse_gtp_info(gtp_output) == legacy_parse_gtp_info(gtp_output)
+
+
+@pytest.mark.parametrize("gtp_output", GTP_OUTPUTS)
+@pytest.mark.parametrize("limit", [0, 1, 2, 5])
+def test_parse_gtp_info_limit(gtp_output, limit):
+    # limit 只解析前 limit 个候选点，结果应与完整解析的前 limit 项一致
+    assert parse_gtp_info(gtp_output, limit) == legacy_parse_gtp_info(gtp_output)[:limit]
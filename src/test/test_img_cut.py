@@ -15,17 +15,13 @@ height = 1314
 
 
 def test_screen_capture():
-    frame = to_ndarray(source_img)
+    # 直接按BGR读入，保存与显示都使用BGR，无需任何通道转换
+    frame = to_ndarray(source_img, bgr=True)
     frame = crop_ndarray(frame, left, top, width, height)
     save_ndarray(frame, folder_path="../../img", filename="target.png")
     if frame is not None:
         print(f"image shape: {frame.shape}")
 
-        if len(frame.shape) == 3 and frame.shape[2] == 4:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-        elif len(frame.shape) == 3 and frame.shape[2] == 3:
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
         cv2.imshow('Screen Capture', frame)
         print("Press any key to close the window...")
         cv2.waitKey(0)
@@ -1,5 +1,5 @@
 from src.engine.board_recognizer import  AdvancedBoardRecognizer
-from src.engine.util import to_ndarray
+from src.engine.util import to_ndarray_cached
 
 
 target_img = "../../img/target.png"
@@ -23,7 +23,7 @@ if __name__ == '__main__':
             "black_threshold": black_threshold,
             "white_threshold": white_threshold,
         }):
-        image = to_ndarray("../../img/target.png")
+        image = to_ndarray_cached("../../img/target.png", bgr=True)
         board_state, meta_info = recognizer.recognize(image)
         if board_state is not None:
             print("Chessboard recognition results：")
@@ -1,89 +1,239 @@
 import logging
+import queue
 import threading
 import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
 
 from src.engine.analysis_engine import KatagoEngine
 from src.engine.board import ChessBoard
 from src.engine.board_recognizer import AdvancedBoardRecognizer
 from src.engine.image_capture import ScreenCapture
 from src.engine.user_report import QTReport
+from src.engine.util import set_thread_affinity
+
+
+@dataclass(frozen=True, slots=True)
+class YyslsConfig:
+    """
+    全部运行参数，模块导入时创建一次，各组件的配置字典由这里派生
+    """
+    grid_size: int = 15  # 15x15 Chessboard
+    cell_size: int = 89  # The size of each grid
+    piece_size: int = 69  # Chess size
+    image_size: int = 1314  # image size
+    left: int = 625  # Distance to the left of the chessboard
+    top: int = 69  # Distance from the top of the chessboard
+    katago_path: str = r"D:\project\model\KataGomo20250206\engine\gom15x_trt.exe"
+    model_path: str = r"D:\project\model\KataGomo20250206\weights\zhizi_renju28b_s1600.bin.gz"
+    config_path: str = r"..\engine\algorithm\katago\gtp_engine.cfg"
+    rule: str = "FREESTYLE"
+    #rule: str = "RENJU"
+    visits_threshold: int = 2000
+    chess_manual_size: int = 5000
+    #chess_manual_path: str = r"..\engine\algorithm\katago\chess_manual_dict_for_renju.pkl"
+    chess_manual_path: str = r"..\engine\algorithm\katago\chess_manual_dict_for_freestyle.pkl"
+    search_threads: Optional[int] = None  # KataGo numSearchThreads, None keeps the value in config_path
+    nn_max_batch_size: Optional[int] = None  # KataGo nnMaxBatchSize, None keeps the value in config_path
+    capture_cpus: Optional[frozenset] = None  # CPU cores for the capture/recognize loop, e.g. frozenset({0, 1}); None disables pinning
+    katago_cpus: Optional[frozenset] = None  # CPU cores for the KataGo process, e.g. frozenset({2, 3, 4, 5}); None disables pinning
+    black_threshold: float = 0.2
+    white_threshold: float = 0.7
+    frame_interval: float = 0.1  # Screen polling interval (seconds)
+    recognize_interval: float = 2  # Minimum seconds between two recognitions, skips piece-placing animation frames
+    frame_refresh_interval: float = 10  # Re-analyze an unchanged frame at most every N seconds
+    thumbnail_size: int = 64  # Frame change detection compares a thumbnail of about N x N pixels
+    pixel_change_threshold: int = 32  # A thumbnail pixel counts as changed above this channel difference
+    frame_change_pixels: int = 4  # A frame counts as changed when at least N thumbnail pixels changed
+    invalid_boards_before_reset: int = 5  # Clear KataGo's board after N consecutive invalid boards mid-game
+
+    def recognizer_config(self) -> dict:
+        return {
+            "grid_size": self.grid_size,
+            "cell_size": self.cell_size,
+            "piece_size": self.piece_size,
+            "image_size": self.image_size,
+            "black_threshold": self.black_threshold,
+            "white_threshold": self.white_threshold,
+        }
+
+    def capture_config(self) -> dict:
+        return {
+            "tool": "mss",  # mss / dxgi(Windows, 需安装dxcam) / pyautogui
+            "region": {"left": self.left, "top": self.top, "width": self.image_size, "height": self.image_size}
+        }
+
+    def katago_config(self) -> dict:
+        return {
+            "katago_path": self.katago_path,
+            "model_path": self.model_path,
+            "config_path": self.config_path,
+            "rule": self.rule,
+            "board_size": self.grid_size,
+            "visits_threshold": self.visits_threshold,
+            "chess_manual_size": self.chess_manual_size,
+            "chess_manual_path": self.chess_manual_path,
+            "search_threads": self.search_threads,
+            "nn_max_batch_size": self.nn_max_batch_size,
+            "katago_cpus": self.katago_cpus,
+        }
+
+    def report_config(self) -> dict:
+        return {
+            "top": self.top,
+            "left": self.left,
+            "grid_size": self.grid_size,
+            "cell_size": self.cell_size,
+            "piece_size": self.piece_size,
+            "image_size": self.image_size,
+        }
+
 
-grid_size = 15  # 15x15 Chessboard
-cell_size = 89  # The size of each grid
-piece_size = 69  # Chess size
-image_size = 1314  # image size
-left = 625  # Distance to the left of the chessboard
-top = 69  # Distance from the top of the chessboard
-katago_path = r"D:\project\model\KataGomo20250206\engine\gom15x_trt.exe"
-model_path = r"D:\project\model\KataGomo20250206\weights\zhizi_renju28b_s1600.bin.gz"
-config_path = r"..\engine\algorithm\katago\gtp_engine.cfg"
-rule = "FREESTYLE"
-#rule = "RENJU"
-visits_threshold = 2000
-chess_manual_size = 5000
-#chess_manual_path = r"..\engine\algorithm\katago\chess_manual_dict_for_renju.pkl"
-chess_manual_path = r"..\engine\algorithm\katago\chess_manual_dict_for_freestyle.pkl"
-black_threshold = 0.2
-white_threshold = 0.7
+CFG = YyslsConfig()
 
 logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
     level=logging.INFO,
     datefmt='%y%m%d %I:%M:%S'
 )
-recognizer = AdvancedBoardRecognizer()
-capture = ScreenCapture()
-katago = KatagoEngine()
-report = QTReport()
+
+
+@lru_cache(maxsize=None)
+def components():
+    """
+    首次调用时才创建识别器、截图、引擎与界面组件，之后返回同一组实例；仅导入本模块时不创建QApplication
+    """
+    return AdvancedBoardRecognizer(), ScreenCapture(), KatagoEngine(), QTReport()
+
+
+def frame_thumbnail(image: np.ndarray) -> np.ndarray:
+    """
+    按步长抽样得到约 thumbnail_size x thumbnail_size 的缩略图（只取BGR通道），用于廉价地判断画面是否变化
+    """
+    step = max(1, image.shape[0] // CFG.thumbnail_size)
+    return image[::step, ::step, :3].astype(np.int16)
+
+
+def frame_changed(thumb: np.ndarray, last_thumb) -> bool:
+    """
+    一颗棋子在缩略图中约占3x3个像素，少量像素变化（如鼠标指针）不视为画面变化
+    """
+    if last_thumb is None or thumb.shape != last_thumb.shape:
+        return True
+    changed = np.abs(thumb - last_thumb).max(axis=2) > CFG.pixel_change_threshold
+    return np.count_nonzero(changed) >= CFG.frame_change_pixels
+
+
+def publish_latest(board_queue: queue.Queue, item):
+    """
+    放入最新一帧，分析线程尚未取走的旧帧直接丢弃；只有一个生产者，清空后放入不会失败
+    """
+    try:
+        board_queue.get_nowait()
+    except queue.Empty:
+        pass
+    board_queue.put_nowait(item)
+
+
+def analysis_task(board_queue: queue.Queue):
+    _, _, katago, report = components()
+    last_board_hash = None
+    in_game = False
+    invalid_boards = 0
+    # 引擎仍在搜索的最后一个局面；画面不变时截图线程不会送来新棋盘，由这里定时重新查询，
+    # kata-analyze 持续输出的新结果才能刷新到界面上
+    searching = None
+    while True:
+        try:
+            image, board = board_queue.get(timeout=CFG.recognize_interval if searching else None)
+        except queue.Empty:
+            image, board = searching
+        try:
+            effective = board.is_effective_chessboard()
+            winner = board.is_game_over() if effective else 0
+            if effective and winner == 0:
+                in_game = True
+                invalid_boards = 0
+                # 画面变化但棋盘未变（如鼠标移动），且该局面已有最终结果时，界面上已是最终结果，无需再次分析
+                if board.get_hash() != last_board_hash or not katago.has_final_result(board):
+                    last_board_hash = board.get_hash()
+                    player, moves, info = katago.analyze(board)
+                    player2ch = "黑方" if player == "B" else "白方" if player == "W" else "PASS"
+                    logging.info(f"============Current Chess Execution: {player2ch}============")
+                    if player2ch != "PASS":
+                        logging.info(f"Best way to go: {moves}")
+                        report.update(image, board, moves, info)
+                searching = None if katago.has_final_result(board) else (image, board)
+            else:
+                searching = None
+                invalid_boards = 0 if effective else invalid_boards + 1
+                # 单帧识别错误（鼠标遮挡棋子、落子动画）不清空引擎棋盘，保留KataGo的搜索树；
+                # 对局结束或连续多帧无效时才清空一次，KataGo进程保持运行，下一局无需重新启动
+                if in_game and (winner != 0 or invalid_boards >= CFG.invalid_boards_before_reset):
+                    katago.reset()
+                    in_game = False
+                last_board_hash = None
+                report.update(image, ChessBoard(size=15), [], {})
+        except Exception as e:
+            logging.error(f"Analysis execution error: {str(e)}", exc_info=True)
 
 
 def update_task():
+    recognizer, capture, katago, report = components()
     try:
-        logging.info(f"Program startup, current mode is: {rule}，Start initializing components...")
-        recognizer.initialize(config={
-            "grid_size": grid_size,
-            "cell_size": cell_size,
-            "piece_size": piece_size,
-            "image_size": image_size,
-            "black_threshold": black_threshold,
-            "white_threshold": white_threshold,
-        })
+        logging.info(f"Program startup, current mode is: {CFG.rule}，Start initializing components...")
+        recognizer.initialize(config=CFG.recognizer_config())
         logging.info("Chessboard recognizer initialization completed!")
 
-        capture.initialize(config={
-            "tool": "mss",
-            "region": {"left": left, "top": top, "width": image_size, "height": image_size}
-        })
+        capture.initialize(config=CFG.capture_config())
         logging.info("Screen capture initialization completed!")
 
-        katago.initialize(config={
-            "katago_path": katago_path,
-            "model_path": model_path,
-            "config_path": config_path,
-            "rule": rule,
-            "board_size": grid_size,
-            "visits_threshold": visits_threshold,
-            "chess_manual_size": chess_manual_size,
-            "chess_manual_path": chess_manual_path,
-
-        })
+        katago.initialize(config=CFG.katago_config())
         logging.info("KataGo engine initialization completed")
         logging.info("Enter the main loop...")
+        # 识别与分析分两个线程流水执行：引擎分析期间继续截图识别，队列只保留最新一帧的棋盘
+        board_queue = queue.Queue(maxsize=1)
+        threading.Thread(target=analysis_task, args=(board_queue,), daemon=True).start()
+        # 分析线程与KataGo已启动，之后只绑定截图识别所在的当前线程，不影响它们
+        set_thread_affinity(CFG.capture_cpus)
+        # 主循环每轮都要读取的间隔参数提前取到局部变量
+        frame_interval = CFG.frame_interval
+        recognize_interval = CFG.recognize_interval
+        frame_refresh_interval = CFG.frame_refresh_interval
+        refresh_event = report.refresh_event
+        last_thumb = None
+        # 上次由画面变化触发识别的时间，最小识别间隔只约束这类识别；上次任意识别的时间，用于定时刷新
+        last_change_t = -recognize_interval
+        last_recognize_t = time.monotonic()
+        force_refresh = False
         while True:
             try:
+                start = time.monotonic()
+                # 每个周期都截图并比较缩略图，与上次识别的画面而非上一帧比较：
+                # 落子动画期间被最小识别间隔推迟的变化，会在间隔结束后被补上
                 image = capture.capture_frame()
-                board, meta_info = recognizer.recognize(image)
-                if board.is_effective_chessboard() and board.is_game_over() == 0:
-                    player, moves, info = katago.analyze(board)
-                    player2ch = "黑方" if player == "B" else "白方" if player == "W" else "PASS"
-                    logging.info(f"============Current Chess Execution: {player2ch}============")
-                    if player2ch != "PASS":
-                        logging.info(f"Best way to go: {moves}")
-                        report.update(image, board, moves, info)
-                    time.sleep(2)
+                thumb = frame_thumbnail(image)
+                if force_refresh:
+                    recognize_now = True
+                elif frame_changed(thumb, last_thumb):
+                    recognize_now = start - last_change_t >= recognize_interval
+                    if recognize_now:
+                        last_change_t = start
                 else:
-                    report.update(image, ChessBoard(size=15), [], {})
-                    time.sleep(2)
+                    # 定时刷新不重置最小识别间隔，之后的落子仍可立即触发识别
+                    recognize_now = start - last_recognize_t >= frame_refresh_interval
+                if recognize_now:
+                    last_thumb = thumb
+                    last_recognize_t = start
+                    board, meta_info = recognizer.recognize(image)
+                    publish_latest(board_queue, (image, board))
+                # 用户在界面上请求刷新时立即醒来，否则等到下一个截图周期
+                force_refresh = refresh_event.wait(max(0.0, frame_interval - (time.monotonic() - start)))
+                if force_refresh:
+                    refresh_event.clear()
 
             except Exception as e:
                 logging.error(f"Loop execution error: {str(e)}", exc_info=True)
@@ -103,15 +253,9 @@ def update_task():
 
 
 if __name__ == '__main__':
+    report = components()[3]
     try:
-        report.initialize(config={
-            "top": top,
-            "left": left,
-            "grid_size": grid_size,
-            "cell_size": cell_size,
-            "piece_size": piece_size,
-            "image_size": image_size,
-        })
+        report.initialize(config=CFG.report_config())
         my_thread = threading.Thread(target=update_task)
         my_thread.start()
         report.event_loop()